@@ -1,34 +1,85 @@
 # app.py
-from fastapi import FastAPI, Request, Depends
-from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.openapi.utils import get_openapi
+"""
+The application factory. Importing this module is cheap: the routes, the
+Mongo client and the templates are only loaded by create_app() and the
+lifespan. `uvicorn app:app` and `from app import app` still work, since the
+first access to `app` builds it.
+"""
+from contextlib import asynccontextmanager
 
-from config import SECRET_KEY
-from auth import authenticate_user, create_access_token
-from db import db
-from routes import router as api_router
+from fastapi import FastAPI
+from fastapi.responses import RedirectResponse
 
-app = FastAPI(swagger_ui_parameters={"syntaxHighlight.theme": "obsidian"})
 
-app.include_router(api_router)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    from db import db, connect, close
+    from indexes import ensure_indexes
+    from invalidation import bus
+    import hashing
+    from templating import preload_templates
+    from static_assets import load_assets
 
-def custom_openapi():
-    if app.openapi_schema:
-        return app.openapi_schema
-    openapi_schema = get_openapi(
-        title="Library API",
-        version="2.2.9",
-        summary="This is a very cool Library schema.",
-        description="It has a rent function, post method's for all Tables, and Authorisation with Auntification.",
-        routes=app.routes,
+    # Start the bcrypt workers, connect, warm the pool and create the
+    # indexes the routes rely on before taking traffic
+    hashing.start()
+    await connect()
+    await ensure_indexes(db)
+    await bus.start()
+    preload_templates()
+    load_assets()
+    yield
+    await bus.stop()
+    hashing.shutdown()
+    close()
+
+
+def create_app() -> FastAPI:
+    from fastapi.openapi.utils import get_openapi
+
+    from compression import CompressionMiddleware
+    from metrics import MetricsMiddleware
+    from responses import BSONJSONResponse
+    from routes import router as api_router
+
+    app = FastAPI(
+        lifespan=lifespan,
+        default_response_class=BSONJSONResponse,
+        swagger_ui_parameters={"syntaxHighlight.theme": "obsidian"},
     )
-    openapi_schema["info"]["x-logo"] = {
-        "url": "https://static.vecteezy.com/system/resources/previews/004/852/937/large_2x/book-read-library-study-line-icon-illustration-logo-template-suitable-for-many-purposes-free-vector.jpg"
-    }
-    app.openapi_schema = openapi_schema
-    return app.openapi_schema
-app.openapi = custom_openapi
-
-@app.get("/", summary="Redirect to login page")
-def main():
-    return RedirectResponse("/login")
+
+    app.add_middleware(CompressionMiddleware)
+    # Outermost, so the timings include compression
+    app.add_middleware(MetricsMiddleware)
+    app.include_router(api_router)
+
+    def custom_openapi():
+        if app.openapi_schema:
+            return app.openapi_schema
+        openapi_schema = get_openapi(
+            title="Library API",
+            version="2.2.9",
+            summary="This is a very cool Library schema.",
+            description="It has a rent function, post method's for all Tables, and Authorisation with Auntification.",
+            routes=app.routes,
+        )
+        openapi_schema["info"]["x-logo"] = {
+            "url": "https://static.vecteezy.com/system/resources/previews/004/852/937/large_2x/book-read-library-study-line-icon-illustration-logo-template-suitable-for-many-purposes-free-vector.jpg"
+        }
+        app.openapi_schema = openapi_schema
+        return app.openapi_schema
+    app.openapi = custom_openapi
+
+    @app.get("/", summary="Redirect to login page")
+    def main():
+        return RedirectResponse("/login")
+
+    return app
+
+
+def __getattr__(name):
+    # `app` is built on first access, once per process
+    if name == "app":
+        app = globals()["app"] = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,109 @@
+# archive.py
+"""
+Hot/cold partitioning of Histories.
+
+Returned rents older than ARCHIVE_AFTER_DAYS are moved, in batches, into
+monthly archive collections (HistoriesArchive_YYYY_MM, by return date), so
+Histories only holds active and recent rents. A run can be interrupted and
+restarted safely: documents are copied before they are deleted and copies
+that already exist are skipped.
+
+    python archive.py [--older-than-days 90] [--batch-size 1000]
+"""
+from datetime import datetime, timedelta
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import BulkWriteError
+
+from config import ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH_SIZE
+from db import db, histories_collection
+
+ARCHIVE_PREFIX = "HistoriesArchive_"
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+ARCHIVE_INDEXES = [
+    IndexModel([("dateLoan", DESCENDING)], name="dateLoan"),
+    IndexModel([("user_id", ASCENDING), ("dateLoan", DESCENDING)], name="user_dateLoan"),
+]
+
+
+def bucket_name(date_return: str):
+    # "2024-05-14 09:30:00" -> HistoriesArchive_2024_05
+    return ARCHIVE_PREFIX + date_return[:7].replace("-", "_")
+
+
+async def _copy_to_bucket(name: str, documents: list):
+    try:
+        await db[name].insert_many(documents, ordered=False)
+    except BulkWriteError as e:
+        # Duplicates are copies left by an interrupted run; anything else is real
+        if any(error["code"] != 11000 for error in e.details.get("writeErrors", [])):
+            raise
+
+
+async def archive_returned(older_than_days: int = ARCHIVE_AFTER_DAYS, batch_size: int = ARCHIVE_BATCH_SIZE):
+    """
+    Move returned rents older than `older_than_days` to the archive.
+    Returns the number of documents moved.
+    """
+    cutoff = (datetime.now() - timedelta(days=older_than_days)).strftime(DATE_FORMAT)
+    prepared = set()
+    moved = 0
+    while True:
+        batch = await histories_collection.find(
+            {"isReturned": True, "dateReturn": {"$lt": cutoff}}
+        ).sort("_id", 1).limit(batch_size).to_list(length=None)
+        if not batch:
+            return moved
+
+        buckets = {}
+        for document in batch:
+            buckets.setdefault(bucket_name(document["dateReturn"]), []).append(document)
+        for name, documents in buckets.items():
+            if name not in prepared:
+                await db[name].create_indexes(ARCHIVE_INDEXES)
+                prepared.add(name)
+            await _copy_to_bucket(name, documents)
+
+        await histories_collection.delete_many({"_id": {"$in": [document["_id"] for document in batch]}})
+        moved += len(batch)
+
+
+async def history_stages(match: dict, date_from: str = None, date_to: str = None):
+    """
+    Leading stages of a rent pipeline on Histories.
+
+    Without a date range only the hot collection is read. With one, rents
+    loaned in the range are matched and every archive bucket that can hold
+    them (returned in or after the first month of the range) is unioned in.
+    """
+    if not date_from and not date_to:
+        return [{"$match": match}]
+
+    loaned = {}
+    if date_from:
+        loaned["$gte"] = date_from
+    if date_to:
+        # A bare date ("2024-05-14") covers the whole day
+        loaned["$lte"] = date_to if len(date_to) > 10 else date_to + " 23:59:59"
+    match = {**match, "dateLoan": loaned}
+
+    stages = [{"$match": match}]
+    names = await db.list_collection_names(filter={"name": {"$regex": f"^{ARCHIVE_PREFIX}"}})
+    first_bucket = bucket_name(date_from) if date_from else ""
+    for name in sorted(names):
+        if name >= first_bucket:
+            stages.append({"$unionWith": {"coll": name, "pipeline": [{"$match": match}]}})
+    return stages
+
+
+if __name__ == "__main__":
+    import argparse
+    import asyncio
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--older-than-days", type=int, default=ARCHIVE_AFTER_DAYS)
+    parser.add_argument("--batch-size", type=int, default=ARCHIVE_BATCH_SIZE)
+    args = parser.parse_args()
+    count = asyncio.run(archive_returned(args.older_than_days, args.batch_size))
+    print(f"Archived {count} rents.")
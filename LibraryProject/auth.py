@@ -1,18 +1,23 @@
-# auth.py
+import hashlib
+import time
 import jwt
 from datetime import datetime, timedelta
 from fastapi import HTTPException, status, Request
-from config import SECRET_KEY, ALGORITHM
+from config import SECRET_KEY, ALGORITHM, PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL, TOKEN_CACHE_SIZE, TOKEN_CACHE_TTL
+from cache import TTLCache
+from db import users_collection
 
 
 def create_access_token(data: dict, expires_delta: timedelta = timedelta(minutes=1)):
     to_encode = data.copy()
     expire = datetime.now() + expires_delta
-    print(datetime.now(), expire)  # Перевіряємо значення
     to_encode.update({"exp": int(expire.timestamp())})  # Конвертація в UNIX timestamp
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
-def verify_token(token: str):
+def decode_token(token: str):
+    """
+    Full signature and expiry check, without the cache.
+    """
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         return payload
@@ -21,8 +26,105 @@ def verify_token(token: str):
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
 
+# Decoded-token cache - the same cookie is presented on every request, so
+# its verified payload is kept (keyed by a digest of the token) until the
+# token's own `exp`. Revoked tokens are remembered until they would expire;
+# that deny-list is never trimmed by count, or an evicted revocation would
+# make a logged-out token valid again. Both live in this process only.
+
+token_cache = TTLCache("tokens", maxsize=TOKEN_CACHE_SIZE, ttl=TOKEN_CACHE_TTL)
+revoked_tokens = TTLCache("revoked_tokens", maxsize=None, ttl=TOKEN_CACHE_TTL)
+
+def _token_key(token: str):
+    return hashlib.sha256(token.encode("utf-8")).digest()
+
+def _seconds_left(payload: dict):
+    if "exp" not in payload:
+        return None
+    return payload["exp"] - time.time()
+
+def verify_token(token: str):
+    key = _token_key(token)
+    if revoked_tokens.get(key):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token has been revoked")
+    payload = token_cache.get(key)
+    if payload is not None:
+        return payload
+
+    payload = decode_token(token)
+    seconds_left = _seconds_left(payload)
+    if seconds_left is None or seconds_left > 0:
+        token_cache.set(key, payload, ttl=seconds_left)
+    return payload
+
+def revoke_token(token: str):
+    """
+    Stop accepting `token` in this process, e.g. on logout, until it
+    expires. Other workers keep accepting it: the deny-list is not shared.
+    Invalid or already expired tokens are ignored.
+    """
+    key = _token_key(token)
+    token_cache.pop(key)
+    try:
+        payload = decode_token(token)
+    except HTTPException:
+        return
+    seconds_left = _seconds_left(payload)
+    if seconds_left is None or seconds_left > 0:
+        revoked_tokens.set(key, True, ttl=seconds_left)
+
 def authenticate_user(request: Request):
     token = request.cookies.get("access_token")
     if not token:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
-    return verify_token(token)
\ No newline at end of file
+    return verify_token(token)
+
+# Principal cache - the few user fields routes need, keyed by email
+
+PRINCIPAL_FIELDS = {"_id": 1, "emailUser": 1, "is_admin": 1, "activeRents": 1}
+principal_cache = TTLCache("principals", maxsize=PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_CACHE_TTL)
+# Called with the email on every invalidate_principal (see invalidation.py)
+principal_listeners = []
+
+async def load_principal(email: str):
+    """
+    Return the cached principal for `email`, reading Users only on a miss.
+    Unknown users are not cached, so a later registration is seen at once.
+    """
+    principal = principal_cache.get(email)
+    if principal is None:
+        principal = await users_collection.find_one({"emailUser": email}, PRINCIPAL_FIELDS)
+        if principal:
+            principal_cache.set(email, principal)
+    return principal
+
+def invalidate_principal(email: str, notify: bool = True):
+    """
+    Drop a cached principal. Call after any write to that user's document.
+    """
+    principal_cache.pop(email)
+    if notify:
+        for listener in principal_listeners:
+            listener(email)
+
+def invalidate_principal_id(user_id):
+    """
+    Drop the cached principal of the user with this _id, whatever its email.
+    """
+    principal_cache.discard_if(lambda principal: principal["_id"] == user_id)
+
+async def get_cookie_principal(request: Request):
+    """
+    Dependency for cookie-authenticated routes: the current user's principal.
+    A valid token of a user that no longer exists gets 401 and the cookie is
+    dropped, so GET /login shows the login page again.
+    """
+    user_data = authenticate_user(request)
+    principal = await load_principal(user_data["sub"])
+    if principal is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User not found",
+            headers={"Set-Cookie": 'access_token=""; Max-Age=0; Path=/; HttpOnly; Secure'},
+        )
+    return principal
@@ -0,0 +1,86 @@
+# benchmarks/bench_async_concurrency.py
+"""
+Concurrency scaling of the async routes.
+
+Drives the ASGI app in-process with httpx, so the only I/O is MongoDB.
+Both routes query the database on every request: a book by id, and a
+user's /rents-list (an aggregation over Histories). Point MONGO_URI at a
+local mongod and MONGO_DB_NAME at a scratch database:
+
+    MONGO_DB_NAME=LibraryBench python -m benchmarks.bench_async_concurrency
+"""
+import argparse
+import asyncio
+import time
+from datetime import timedelta
+
+import httpx
+
+from app import app
+from auth import create_access_token
+from config import MONGO_DB_NAME
+from db import books_collection, histories_collection, users_collection
+
+USER_EMAIL = "bench-concurrency@bench.local"
+
+
+async def seed(books: int, rents: int):
+    if await books_collection.estimated_document_count() < books:
+        await books_collection.insert_many(
+            [{"nameBook": f"Book {i}", "yearBook": 2000, "availableBook": 5} for i in range(books)]
+        )
+    book = await books_collection.find_one({}, {"_id": 1})
+    await users_collection.update_one(
+        {"emailUser": USER_EMAIL},
+        {"$set": {"emailUser": USER_EMAIL, "is_admin": False, "nameUser": "Bench"}, "$setOnInsert": {"activeRents": []}},
+        upsert=True,
+    )
+    user = await users_collection.find_one({"emailUser": USER_EMAIL}, {"_id": 1})
+    missing = rents - await histories_collection.count_documents({"user_id": user["_id"]})
+    if missing > 0:
+        await histories_collection.insert_many([
+            {"user_id": user["_id"], "book_id": book["_id"], "dateLoan": "2024-01-01 00:00:00",
+             "dateReturn": "2024-02-01 00:00:00", "isReturned": True}
+            for _ in range(missing)
+        ])
+    return str(book["_id"])
+
+
+async def run_level(client: httpx.AsyncClient, path: str, concurrency: int, requests: int):
+    queue = asyncio.Queue()
+    for _ in range(requests):
+        queue.put_nowait(path)
+
+    async def worker():
+        while not queue.empty():
+            url = queue.get_nowait()
+            response = await client.get(url)
+            response.raise_for_status()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return requests / (time.perf_counter() - started)
+
+
+async def main(args):
+    book_id = await seed(args.books, args.rents)
+    token = create_access_token({"sub": USER_EMAIL}, expires_delta=timedelta(minutes=30))
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench",
+                                 cookies={"access_token": token}) as client:
+        for path in ("/rents-list", f"/book/{book_id}"):
+            for concurrency in args.levels:
+                rps = await run_level(client, path, concurrency, args.requests)
+                print(f"{path:40} concurrency={concurrency:<4} {rps:10.1f} req/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--books", type=int, default=1000)
+    parser.add_argument("--rents", type=int, default=20, help="rent history rows of the bench user")
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 8, 32, 128])
+    args = parser.parse_args()
+    if MONGO_DB_NAME == "LibraryProject":
+        parser.error("the benchmark writes books, a user and rents: set MONGO_DB_NAME to a scratch database")
+    asyncio.run(main(args))
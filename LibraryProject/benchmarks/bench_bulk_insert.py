@@ -0,0 +1,46 @@
+# benchmarks/bench_bulk_insert.py
+"""
+Insert throughput: one insert_one per document (the old POST /book-list
+behaviour) against bulk.bulk_insert at a few chunk sizes.
+
+    MONGO_DB_NAME=LibraryBench python -m benchmarks.bench_bulk_insert --documents 50000
+"""
+import argparse
+import asyncio
+import time
+
+from bulk import bulk_insert
+from db import db
+
+
+def make_books(count: int):
+    return [{"nameBook": f"Book {i}", "yearBook": 1900 + i % 120, "availableBook": i % 7} for i in range(count)]
+
+
+async def main(args):
+    collection = db["BenchBulkInsert"]
+
+    await collection.drop()
+    documents = make_books(args.documents)
+    started = time.perf_counter()
+    for document in documents:
+        await collection.insert_one(document)
+    elapsed = time.perf_counter() - started
+    print(f"{'insert_one loop':24} {args.documents / elapsed:10.0f} docs/s ({elapsed:.2f}s)")
+
+    for chunk_size in args.chunk_sizes:
+        await collection.drop()
+        documents = make_books(args.documents)
+        started = time.perf_counter()
+        await bulk_insert(collection, documents, chunk_size=chunk_size)
+        elapsed = time.perf_counter() - started
+        print(f"{'bulk_insert chunk=' + str(chunk_size):24} {args.documents / elapsed:10.0f} docs/s ({elapsed:.2f}s)")
+
+    await collection.drop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--documents", type=int, default=20000)
+    parser.add_argument("--chunk-sizes", type=int, nargs="+", default=[100, 1000, 5000])
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,75 @@
+# benchmarks/bench_compression.py
+"""
+Bytes on the wire and CPU cost of response compression.
+
+Renders the user book list and builds an /api/rents payload from synthetic
+rows (no database needed), then compresses each body in streaming-sized
+chunks the way CompressionMiddleware does.
+
+    python -m benchmarks.bench_compression --rows 100 1000 10000
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from bson import ObjectId
+
+import compression
+from config import COMPRESSION_FLUSH_SIZE
+from templating import get_template
+
+
+async def book_list_html(rows: int) -> bytes:
+    books = [
+        {"_id": ObjectId(), "nameBook": f"Book number {i}", "yearBook": 1950 + i % 70, "availableBook": i % 5,
+         "categoryName": ["Novel"], "authorName": "George Orwell"}
+        for i in range(rows)
+    ]
+    template = get_template("book-list-roles/user-book-list.html")
+    chunks = [chunk async for chunk in template.generate_async(
+        books=books, username="bench@example.com", rents_book_id=[], next_url=None, first_url=None
+    )]
+    return "".join(chunks).encode("utf-8")
+
+
+def rents_json(rows: int) -> bytes:
+    rents = [
+        {"_id": str(ObjectId()), "user_id": str(ObjectId()), "book_id": str(ObjectId()),
+         "dateLoan": "2024-05-01 12:00:00", "dateReturn": "2024-05-14 09:30:00", "isReturned": True,
+         "username": f"reader{i % 300}@example.com", "bookName": f"Book number {i % 5000}"}
+        for i in range(rows)
+    ]
+    return json.dumps({"rents": rents}).encode("utf-8")
+
+
+def measure(body: bytes, make_compressor, repeat: int = 5):
+    started = time.process_time()
+    for _ in range(repeat):
+        compressor = make_compressor()
+        size = 0
+        for offset in range(0, len(body), COMPRESSION_FLUSH_SIZE):
+            chunk = body[offset:offset + COMPRESSION_FLUSH_SIZE]
+            size += len(compressor.compress(chunk, final=offset + COMPRESSION_FLUSH_SIZE >= len(body)))
+    return size, (time.process_time() - started) / repeat
+
+
+def main(args):
+    codecs = [(f"gzip-{level}", lambda level=level: compression._Gzip(level)) for level in args.gzip_levels]
+    if compression.zstandard is not None:
+        codecs += [(f"zstd-{level}", lambda level=level: compression._Zstd(level)) for level in args.zstd_levels]
+
+    for rows in args.rows:
+        for label, body in (("book-list html", asyncio.run(book_list_html(rows))), ("rents json", rents_json(rows))):
+            print(f"{label} rows={rows}: {len(body) / 1024:.1f} KiB uncompressed")
+            for codec, make_compressor in codecs:
+                size, cpu = measure(body, make_compressor)
+                print(f"    {codec:8} {size / 1024:9.1f} KiB  ratio={len(body) / size:5.1f}  cpu={cpu * 1000:7.2f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--gzip-levels", type=int, nargs="+", default=[1, 6, 9])
+    parser.add_argument("--zstd-levels", type=int, nargs="+", default=[1, 3, 9])
+    main(parser.parse_args())
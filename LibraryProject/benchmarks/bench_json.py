@@ -0,0 +1,72 @@
+# benchmarks/bench_json.py
+"""
+Serialization cost of book and rent payloads: the old dumps/loads round
+trip through JSONResponse against BSONJSONResponse. No database needed.
+
+    python -m benchmarks.bench_json
+"""
+import argparse
+import json
+import time
+from datetime import datetime
+
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+
+from responses import BSONJSONResponse
+
+
+class CustomJSONEncoder(json.JSONEncoder):
+    # The encoder book_page used before BSONJSONResponse
+    def default(self, obj):
+        if isinstance(obj, ObjectId):
+            return str(obj)
+        if isinstance(obj, datetime):
+            return obj.isoformat()
+        return super().default(obj)
+
+
+def book():
+    return {"_id": ObjectId(), "nameBook": "Nineteen Eighty-Four", "yearBook": 1949, "availableBook": 3,
+            "category_id": ObjectId(), "author_id": ObjectId(), "categoryName": ["Novel"], "authorName": "George Orwell"}
+
+
+def rent():
+    return {"_id": ObjectId(), "user_id": ObjectId(), "book_id": ObjectId(), "dateLoan": datetime.now(),
+            "dateReturn": datetime.now(), "isReturned": True, "username": "reader@example.com", "bookName": "Animal Farm"}
+
+
+def old_render(content):
+    return JSONResponse(content=json.loads(json.dumps(content, cls=CustomJSONEncoder))).body
+
+
+def new_render(content):
+    return BSONJSONResponse(content).body
+
+
+def run(label, render, content, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        render(content)
+    elapsed = time.perf_counter() - started
+    print(f"    {label:14} {elapsed / repeat * 1e6:10.1f} us/response")
+
+
+def main(args):
+    payloads = {
+        "single book": book(),
+        f"{args.rows} books": {"books": [book() for _ in range(args.rows)]},
+        f"{args.rows} rents": {"rents": [rent() for _ in range(args.rows)]},
+    }
+    for name, content in payloads.items():
+        print(name)
+        repeat = args.repeat if name == "single book" else max(args.repeat // args.rows, 10)
+        run("dumps/loads", old_render, content, repeat)
+        run("BSONJSON", new_render, content, repeat)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20000)
+    main(parser.parse_args())
@@ -0,0 +1,78 @@
+# benchmarks/bench_login_storm.py
+"""
+Catalog latency during a login storm.
+
+Measures /api/books latency on its own and again while a burst of
+concurrent /api/login calls is running. Compare the bcrypt process pool
+with the threadpool fallback:
+
+    MONGO_DB_NAME=LibraryBench python -m benchmarks.bench_login_storm
+    MONGO_DB_NAME=LibraryBench HASH_POOL_SIZE=0 python -m benchmarks.bench_login_storm
+"""
+import argparse
+import asyncio
+import time
+
+import bcrypt
+import httpx
+
+import hashing
+from app import app
+from config import HASH_POOL_SIZE, MONGO_DB_NAME
+from db import users_collection
+
+EMAIL = "bench-login@example.com"
+PASSWORD = "bench-password"
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[min(int(len(samples) * fraction), len(samples) - 1)]
+
+
+async def catalog_latencies(client: httpx.AsyncClient, requests: int):
+    latencies = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        await client.get("/api/books")
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+async def login_storm(client: httpx.AsyncClient, logins: int):
+    statuses = await asyncio.gather(*(
+        client.post("/api/login", json={"emailUser": EMAIL, "passwordUser": PASSWORD}) for _ in range(logins)
+    ))
+    return sum(response.status_code == 503 for response in statuses)
+
+
+def report(label, latencies):
+    print(f"{label:14} p50={percentile(latencies, 0.5) * 1000:7.1f}ms p99={percentile(latencies, 0.99) * 1000:7.1f}ms")
+
+
+async def main(args):
+    await users_collection.update_one(
+        {"emailUser": EMAIL},
+        {"$set": {"emailUser": EMAIL, "is_admin": False,
+                  "passwordUser": bcrypt.hashpw(PASSWORD.encode(), bcrypt.gensalt()).decode()}},
+        upsert=True,
+    )
+    print(f"HASH_POOL_SIZE={HASH_POOL_SIZE}")
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        report("idle", await catalog_latencies(client, args.requests))
+        storm = asyncio.create_task(login_storm(client, args.logins))
+        report("login storm", await catalog_latencies(client, args.requests))
+        rejected = await storm
+    print(f"logins={args.logins} rejected_with_503={rejected} hashing={hashing.stats}")
+    hashing.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--logins", type=int, default=100)
+    args = parser.parse_args()
+    if MONGO_DB_NAME == "LibraryProject":
+        parser.error("the benchmark upserts a user with a known password: set MONGO_DB_NAME to a scratch database")
+    asyncio.run(main(args))
@@ -0,0 +1,94 @@
+# benchmarks/bench_rent_stress.py
+"""
+Concurrency stress test for rent/return.
+
+Fires hundreds of parallel rents at one book, first through the old
+read-then-write sequence and then through rentals.rent_or_return, and
+checks that stock, open rents and users' activeRents stay consistent.
+Exits non-zero if the new path ever oversells. Use a scratch database:
+
+    MONGO_DB_NAME=LibraryBench python -m benchmarks.bench_rent_stress
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from datetime import datetime
+
+from bson import ObjectId
+from fastapi import HTTPException
+
+from config import MONGO_DB_NAME
+from db import db, books_collection, histories_collection
+from indexes import ensure_indexes
+from rentals import rent_or_return
+
+
+async def legacy_rent(user_id, book_id):
+    # The five round trips rent_book used to make
+    date_now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    await db["Users"].find_one({"_id": user_id})
+    rent = await histories_collection.find_one({"user_id": user_id, "book_id": book_id, "isReturned": False})
+    if rent is None:
+        await histories_collection.insert_one(
+            {"user_id": user_id, "book_id": book_id, "dateLoan": date_now, "isReturned": False}
+        )
+        await books_collection.update_one({"_id": book_id}, {"$inc": {"availableBook": -1}})
+    await books_collection.find_one({"_id": book_id})
+
+
+async def new_rent(user_id, book_id):
+    try:
+        await rent_or_return(user_id, book_id)
+    except HTTPException as e:
+        if e.status_code != 409:
+            raise
+
+
+async def run(label, rent, renters, stock):
+    book_id = (await books_collection.insert_one(
+        {"nameBook": f"Stress {label}", "yearBook": 2000, "availableBook": stock}
+    )).inserted_id
+    latencies = []
+
+    async def one(user_id):
+        started = time.perf_counter()
+        await rent(user_id, book_id)
+        latencies.append(time.perf_counter() - started)
+
+    users = await db["Users"].insert_many(
+        [{"emailUser": f"{ObjectId()}@bench.local", "activeRents": []} for _ in range(renters)]
+    )
+    await asyncio.gather(*(one(user_id) for user_id in users.inserted_ids))
+
+    available = (await books_collection.find_one({"_id": book_id}))["availableBook"]
+    open_rents = await histories_collection.count_documents({"book_id": book_id, "isReturned": False})
+    holders = await db["Users"].count_documents({"activeRents": book_id})
+    latencies.sort()
+    print(f"{label:7} stock={stock} renters={renters} open_rents={open_rents} availableBook={available} "
+          f"p50={statistics.median(latencies) * 1000:.1f}ms p99={latencies[int(len(latencies) * 0.99) - 1] * 1000:.1f}ms")
+    if rent is new_rent and holders != open_rents:
+        print(f"{holders} users hold the book in activeRents, expected {open_rents}")
+        return False
+    return available >= 0 and open_rents + available == stock
+
+
+async def main(args):
+    await ensure_indexes(db)
+    await run("legacy", legacy_rent, args.renters, args.stock)
+    consistent = await run("atomic", new_rent, args.renters, args.stock)
+    if not consistent:
+        print("Stock is inconsistent after the atomic run")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--renters", type=int, default=500)
+    parser.add_argument("--stock", type=int, default=50)
+    args = parser.parse_args()
+    if MONGO_DB_NAME == "LibraryProject":
+        parser.error("the benchmark writes users, books and rents: set MONGO_DB_NAME to a scratch database")
+    sys.exit(asyncio.run(main(args)))
@@ -0,0 +1,353 @@
+# benchmarks/bench_routes.py
+"""
+End-to-end load test of every route.
+
+Seeds a scratch database with a catalog, users and rent history, then
+drives each route of routes.py through the ASGI app (no network, no
+uvicorn) at a fixed concurrency and prints throughput and p50/p95/p99 per
+route as JSON. The seed is deterministic (--seed), so runs are comparable.
+
+    MONGO_DB_NAME=LibraryBench python -m benchmarks.bench_routes
+    MONGO_DB_NAME=LibraryBench python -m benchmarks.bench_routes --books 20000 --histories 100000 --concurrency 32
+
+With --thresholds the run exits non-zero when a route misses its budget
+(p50_ms/p95_ms/p99_ms maxima, min_rps, max_errors), so it can gate CI:
+
+    MONGO_DB_NAME=LibraryBench python -m benchmarks.bench_routes \\
+        --thresholds benchmarks/route_thresholds.json --output route-report.json
+
+--in-memory replaces the MongoDB client with mongomock-motor (installed
+separately), for runs without a mongod. Its timings only show the cost of
+the Python side and are not comparable with a real server.
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import sys
+import time
+from datetime import datetime, timedelta
+
+from config import MONGO_DB_NAME
+
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+PASSWORD = "bench-password"
+ADMIN_EMAIL = "bench-admin@bench.local"
+
+
+def use_in_memory_client():
+    # Must run before db.py is imported
+    import motor.motor_asyncio
+    import mongomock_motor
+
+    class InMemoryClient(mongomock_motor.AsyncMongoMockClient):
+        def __init__(self, *args, **kwargs):
+            super().__init__()
+
+    motor.motor_asyncio.AsyncIOMotorClient = InMemoryClient
+
+    # mongomock has no sessions, change streams or capped collections
+    import config
+    config.MONGO_CAUSAL_SESSIONS = False
+    config.INVALIDATION_MODE = "off"
+
+
+def percentile(samples, fraction):
+    return samples[min(int(len(samples) * fraction), len(samples) - 1)]
+
+
+def user_email(i):
+    return f"bench-user-{i}@bench.local"
+
+
+async def seed(args):
+    """
+    Drop and refill the scratch database. Returns the ids the scenarios use.
+    """
+    import bcrypt
+
+    from catalog import denormalize_books
+    from db import db, client
+
+    rng = random.Random(args.seed)
+    await client.drop_database(db.name)
+
+    authors = [{"nameAuthor": f"Name{i}", "surnameAuthor": f"Surname{i}"} for i in range(args.authors)]
+    author_ids = (await db["Authors"].insert_many(authors)).inserted_ids
+    categories = [{"nameCategory": f"Category{i}"} for i in range(args.categories)]
+    category_ids = (await db["Categories"].insert_many(categories)).inserted_ids
+
+    books = [{
+        "nameBook": f"Book {i}",
+        "yearBook": rng.randint(1900, 2024),
+        "availableBook": rng.randint(1, 10),
+        "category_id": rng.choice(category_ids),
+        "author_id": rng.choice(author_ids),
+    } for i in range(args.books)]
+    await denormalize_books(books)
+    book_ids = (await db["Books"].insert_many(books)).inserted_ids
+
+    # One hash for everyone: seeding should not take bcrypt time per user
+    password = bcrypt.hashpw(PASSWORD.encode(), bcrypt.gensalt()).decode()
+    users = [{"emailUser": user_email(i), "passwordUser": password, "is_admin": False,
+              "nameUser": f"User{i}", "activeRents": []} for i in range(args.users)]
+    users.append({"emailUser": ADMIN_EMAIL, "passwordUser": password, "is_admin": True, "activeRents": []})
+    user_ids = (await db["Users"].insert_many(users)).inserted_ids[:args.users]
+
+    now = datetime.now()
+    histories = []
+    for _ in range(args.histories):
+        loaned = now - timedelta(minutes=rng.randint(60, 60 * 24 * 365))
+        histories.append({
+            "user_id": rng.choice(user_ids),
+            "book_id": rng.choice(book_ids),
+            "dateLoan": loaned.strftime(DATE_FORMAT),
+            "dateReturn": (loaned + timedelta(minutes=rng.randint(10, 60 * 24 * 30))).strftime(DATE_FORMAT),
+            "isReturned": True,
+        })
+    # A few open rents per user, mirrored in activeRents and the stock
+    for user_id in user_ids:
+        held = rng.sample(book_ids, min(args.open_rents, len(book_ids)))
+        for book_id in held:
+            histories.append({"user_id": user_id, "book_id": book_id,
+                              "dateLoan": now.strftime(DATE_FORMAT), "isReturned": False})
+            await db["Books"].update_one({"_id": book_id}, {"$inc": {"availableBook": -1}})
+        await db["Users"].update_one({"_id": user_id}, {"$set": {"activeRents": held}})
+    for start in range(0, len(histories), 10000):
+        await db["Histories"].insert_many(histories[start:start + 10000])
+
+    return {"author_ids": author_ids, "category_ids": category_ids, "book_ids": book_ids}
+
+
+def scenarios(ids, tokens, run_id):
+    """
+    (name, request factory, accepted statuses, prepare). A factory takes the
+    request number and returns the arguments of httpx.AsyncClient.request.
+    `prepare(client, n)` creates whatever n destructive requests will consume.
+    """
+    from db import db
+
+    book_ids = [str(i) for i in ids["book_ids"]]
+    author_id = str(ids["author_ids"][0])
+    category_id = str(ids["category_ids"][0])
+    admin = {"access_token": tokens["admin"]}
+    bearer = {"Authorization": f"Bearer {tokens['admin']}"}
+    user_bearer = {"Authorization": f"Bearer {tokens['users'][0]}"}
+
+    def user_cookie(i):
+        return {"access_token": tokens["users"][i % len(tokens["users"])]}
+
+    def book(i):
+        return book_ids[i % len(book_ids)]
+
+    def book_body(i, book_id="new"):
+        return {"id": book_id, "nameBook": f"Load {run_id} {i}", "yearBook": 2000, "availableBook": 5,
+                "category_id": category_id, "author_id": author_id}
+
+    doomed = {}
+
+    async def prepare_books(client, n):
+        books = [{"nameBook": f"Doomed {i}", "availableBook": 1} for i in range(n)]
+        doomed["books"] = [str(i) for i in (await db["Books"].insert_many(books)).inserted_ids]
+
+    async def prepare_authors(client, n):
+        authors = [{"nameAuthor": "Doomed", "surnameAuthor": str(i)} for i in range(n)]
+        doomed["authors"] = [str(i) for i in (await db["Authors"].insert_many(authors)).inserted_ids]
+
+    async def prepare_categories(client, n):
+        doomed["categories"] = [f"Doomed {run_id} {i}" for i in range(n)]
+        await db["Categories"].insert_many([{"nameCategory": name} for name in doomed["categories"]])
+
+    etag = {}
+
+    async def prepare_etag(client, n):
+        etag["catalog"] = (await client.get("/api/books")).headers["etag"]
+
+    ok = {200}
+    redirect = {302, 303, 307}
+    return [
+        ("GET /", lambda i: {"method": "GET", "url": "/"}, redirect, None),
+        ("GET /favicon.ico", lambda i: {"method": "GET", "url": "/favicon.ico"}, ok, None),
+        ("GET /login", lambda i: {"method": "GET", "url": "/login"}, ok, None),
+        ("GET /registration", lambda i: {"method": "GET", "url": "/registration"}, ok, None),
+        ("POST /login", lambda i: {"method": "POST", "url": "/login", "json": {
+            "emailUser": user_email(i % len(tokens["users"])), "passwordUser": PASSWORD}}, ok, None),
+        ("POST /api/login", lambda i: {"method": "POST", "url": "/api/login", "json": {
+            "emailUser": user_email(i % len(tokens["users"])), "passwordUser": PASSWORD}}, ok, None),
+        ("POST /registration", lambda i: {"method": "POST", "url": "/registration", "json": {
+            "nameUser": "Load", "surnameUser": "Test", "emailUser": f"load-{run_id}-{i}@bench.local",
+            "passwordUser": PASSWORD, "numberUser": "0123456789"}}, ok, None),
+        ("GET /book-list (user)", lambda i: {"method": "GET", "url": "/book-list", "cookies": user_cookie(i)}, ok, None),
+        ("GET /book-list (admin)", lambda i: {"method": "GET", "url": "/book-list", "cookies": admin}, ok, None),
+        ("GET /api/books", lambda i: {"method": "GET", "url": "/api/books"}, ok, None),
+        ("GET /api/books (304)", lambda i: {"method": "GET", "url": "/api/books",
+                                            "headers": {"If-None-Match": etag["catalog"]}}, {304}, prepare_etag),
+        ("GET /api/books?category", lambda i: {"method": "GET", "url": "/api/books",
+                                               "params": {"category": category_id}}, ok, None),
+        ("GET /books/search", lambda i: {"method": "GET", "url": "/books/search",
+                                         "params": {"q": f"Book {i % 100}"}}, ok, None),
+        ("GET /books/search (prefix)", lambda i: {"method": "GET", "url": "/books/search",
+                                                  "params": {"q": f"book {i % 100}", "prefix": "true"}}, ok, None),
+        ("GET /book/{id}", lambda i: {"method": "GET", "url": f"/book/{book(i)}"}, ok, None),
+        ("POST /book", lambda i: {"method": "POST", "url": "/book", "json": book_body(i), "cookies": admin}, ok, None),
+        ("PUT /book", lambda i: {"method": "PUT", "url": "/book", "json": book_body(i, book(i)), "cookies": admin},
+         ok, None),
+        ("DELETE /book/{id}", lambda i: {"method": "DELETE", "url": f"/book/{doomed['books'][i]}", "cookies": admin},
+         ok, prepare_books),
+        ("POST /book-list", lambda i: {"method": "POST", "url": "/book-list", "json": [
+            {"nameBook": f"Bulk {run_id} {i} {j}", "availableBook": 1} for j in range(100)]}, ok, None),
+        ("POST /book/{id}/rent", lambda i: {"method": "POST", "url": f"/book/{book(i // 2)}/rent",
+                                            "cookies": user_cookie(i // 2)}, {200, 409}, None),
+        ("GET /rents-list (user)", lambda i: {"method": "GET", "url": "/rents-list", "cookies": user_cookie(i)}, ok, None),
+        ("GET /rents-list (admin)", lambda i: {"method": "GET", "url": "/rents-list", "cookies": admin}, ok, None),
+        ("GET /api/rents (user)", lambda i: {"method": "GET", "url": "/api/rents", "headers": user_bearer}, ok, None),
+        ("GET /api/rents (admin)", lambda i: {"method": "GET", "url": "/api/rents", "headers": bearer}, ok, None),
+        ("GET /api/rents (ndjson)", lambda i: {"method": "GET", "url": "/api/rents", "params": {"stream": "true"},
+                                               "headers": bearer}, ok, None),
+        ("GET /api/cache-stats", lambda i: {"method": "GET", "url": "/api/cache-stats", "headers": bearer}, ok, None),
+        ("GET /api/hash-stats", lambda i: {"method": "GET", "url": "/api/hash-stats", "headers": bearer}, ok, None),
+        ("GET /metrics", lambda i: {"method": "GET", "url": "/metrics"}, ok, None),
+        ("GET /authors", lambda i: {"method": "GET", "url": "/authors"}, ok, None),
+        ("POST /authors", lambda i: {"method": "POST", "url": "/authors", "headers": bearer, "json": [
+            {"nameAuthor": f"Load{i}", "surnameAuthor": str(j)} for j in range(10)]}, ok, None),
+        ("DELETE /authors", lambda i: {"method": "DELETE", "url": "/authors", "headers": bearer,
+                                       "data": {"author_id": doomed["authors"][i]}}, ok, prepare_authors),
+        ("GET /categories", lambda i: {"method": "GET", "url": "/categories"}, ok, None),
+        ("POST /categories", lambda i: {"method": "POST", "url": "/categories", "headers": bearer, "json": [
+            {"nameCategory": f"Load {run_id} {i} {j}"} for j in range(10)]}, ok, None),
+        ("DELETE /categories", lambda i: {"method": "DELETE", "url": "/categories", "headers": bearer,
+                                          "data": {"nameCategory": doomed["categories"][i]}}, ok, prepare_categories),
+        ("GET /clear-cookie", lambda i: {"method": "GET", "url": "/clear-cookie",
+                                         "cookies": {"access_token": tokens["fresh"](i)}}, redirect, None),
+    ]
+
+
+async def measure(client, factory, accepted, requests, concurrency):
+    latencies = []
+    errors = {}
+    counter = iter(range(requests))
+
+    async def worker():
+        for i in counter:
+            started = time.perf_counter()
+            response = await client.request(**factory(i))
+            latencies.append(time.perf_counter() - started)
+            if response.status_code not in accepted:
+                errors[response.status_code] = errors.get(response.status_code, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "errors": sum(errors.values()),
+        "error_statuses": {str(code): count for code, count in sorted(errors.items())},
+        "rps": round(requests / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+    }
+
+
+def check_thresholds(routes, thresholds):
+    """
+    Compare a report against the budgets; returns the list of violations.
+    """
+    violations = []
+    for name, budget in thresholds.items():
+        result = routes.get(name)
+        if result is None:
+            continue
+        for metric in ("p50_ms", "p95_ms", "p99_ms"):
+            if metric in budget and result[metric] > budget[metric]:
+                violations.append(f"{name}: {metric} {result[metric]} > {budget[metric]}")
+        if "min_rps" in budget and result["rps"] < budget["min_rps"]:
+            violations.append(f"{name}: rps {result['rps']} < {budget['min_rps']}")
+        if result["errors"] > budget.get("max_errors", 0):
+            violations.append(f"{name}: {result['errors']} unexpected responses {result['error_statuses']}")
+    return violations
+
+
+async def main(args):
+    if args.in_memory:
+        use_in_memory_client()
+
+    import httpx
+
+    from app import app
+    from auth import create_access_token
+
+    ids = await seed(args)
+    lifetime = timedelta(hours=1)
+    tokens = {
+        "admin": create_access_token({"sub": ADMIN_EMAIL}, lifetime),
+        "users": [create_access_token({"sub": user_email(i)}, lifetime) for i in range(args.users)],
+        # /clear-cookie revokes its token, so every request gets its own
+        "fresh": lambda i: create_access_token({"sub": user_email(i % args.users), "n": i}, lifetime),
+    }
+    run_id = f"{args.seed}-{int(time.time())}"
+    selected = re.compile(args.only) if args.only else None
+
+    routes = {}
+    async with app.router.lifespan_context(app):
+        # Unhandled errors become 500s, counted as unexpected responses
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            for name, factory, accepted, prepare in scenarios(ids, tokens, run_id):
+                if selected and not selected.search(name):
+                    continue
+                if prepare:
+                    await prepare(client, args.warmup + args.requests)
+                for i in range(args.warmup):
+                    await client.request(**factory(args.requests + i))
+                routes[name] = await measure(client, factory, accepted, args.requests, args.concurrency)
+                print(f"{name:28} {routes[name]['rps']:8.1f} req/s  p95={routes[name]['p95_ms']:8.2f}ms",
+                      file=sys.stderr)
+
+    report = {
+        "database": "in-memory" if args.in_memory else MONGO_DB_NAME,
+        "seed": {"books": args.books, "authors": args.authors, "categories": args.categories,
+                 "users": args.users, "histories": args.histories, "open_rents": args.open_rents},
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "routes": routes,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if args.thresholds:
+        with open(args.thresholds) as f:
+            violations = check_thresholds(routes, json.load(f))
+        for violation in violations:
+            print(f"FAIL {violation}", file=sys.stderr)
+        return 1 if violations else 0
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--books", type=int, default=5000)
+    parser.add_argument("--authors", type=int, default=500)
+    parser.add_argument("--categories", type=int, default=30)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--histories", type=int, default=20000)
+    parser.add_argument("--open-rents", type=int, default=3, help="open rents per seeded user")
+    parser.add_argument("--requests", type=int, default=200, help="measured requests per route")
+    parser.add_argument("--warmup", type=int, default=10, help="unmeasured requests per route")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--only", help="regex: run only the routes whose name matches")
+    parser.add_argument("--thresholds", help="JSON file of per-route budgets")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--in-memory", action="store_true", help="use mongomock-motor instead of MongoDB")
+    args = parser.parse_args()
+    if not args.in_memory and MONGO_DB_NAME == "LibraryProject":
+        parser.error("the seed drops the database: set MONGO_DB_NAME to a scratch database")
+    sys.exit(asyncio.run(main(args)))
@@ -0,0 +1,91 @@
+# benchmarks/bench_search.py
+"""
+Autocomplete and full-text search latency on a large catalog.
+
+Seeds Books with --books generated titles (one million by default; an
+existing seed of the same size is reused), then times catalog.autocomplete
+for random two- and three-letter prefixes and catalog.search_books for
+random words. Exits non-zero if autocomplete p99 exceeds --budget-ms:
+
+    MONGO_DB_NAME=LibraryBench python -m benchmarks.bench_search
+    MONGO_DB_NAME=LibraryBench python -m benchmarks.bench_search --books 100000 --budget-ms 10
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+import time
+
+from catalog import autocomplete, search_key, search_books
+from config import MONGO_DB_NAME
+from db import db, books_collection
+from indexes import ensure_indexes
+
+WORDS = ("animal", "farm", "winter", "river", "shadow", "garden", "silent", "empire", "letters", "night",
+         "ocean", "stone", "mirror", "harvest", "journey", "kingdom", "storm", "orchard", "castle", "voyage")
+MARKER = "Search bench"
+
+
+async def seed(count: int, rng: random.Random):
+    existing = await books_collection.count_documents({"categoryName": MARKER})
+    if existing == count:
+        return
+    await books_collection.delete_many({"categoryName": MARKER})
+    batch = []
+    for i in range(count):
+        name = " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 4))).capitalize() + f" {i}"
+        batch.append({"nameBook": name, "nameLower": search_key(name), "yearBook": rng.randint(1900, 2024),
+                      "availableBook": 1, "authorName": f"Author {i % 5000}", "categoryName": [MARKER]})
+        if len(batch) == 10000:
+            await books_collection.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        await books_collection.insert_many(batch, ordered=False)
+
+
+async def timed(samples: int, call):
+    latencies = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        await call()
+        latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+    return latencies
+
+
+def report(label, latencies):
+    p99 = latencies[min(int(len(latencies) * 0.99), len(latencies) - 1)]
+    print(f"{label:13} p50={statistics.median(latencies):6.2f}ms p99={p99:6.2f}ms")
+    return p99
+
+
+async def main(args):
+    rng = random.Random(args.seed)
+    await seed(args.books, rng)
+    await ensure_indexes(db)
+    print(f"{await books_collection.estimated_document_count()} books")
+
+    def prefix():
+        word = rng.choice(WORDS)
+        return word[:rng.randint(2, 3)]
+
+    autocomplete_p99 = report("autocomplete", await timed(args.samples, lambda: autocomplete(prefix())))
+    # A common word matches a large share of the catalog, so far fewer samples
+    report("search", await timed(max(args.samples // 10, 1), lambda: search_books(rng.choice(WORDS))))
+    if autocomplete_p99 > args.budget_ms:
+        print(f"Autocomplete p99 {autocomplete_p99:.2f}ms is over the {args.budget_ms}ms budget")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--books", type=int, default=1_000_000)
+    parser.add_argument("--samples", type=int, default=500)
+    parser.add_argument("--budget-ms", type=float, default=10.0)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    if MONGO_DB_NAME == "LibraryProject":
+        parser.error("the benchmark seeds up to a million books: set MONGO_DB_NAME to a scratch database")
+    sys.exit(asyncio.run(main(args)))
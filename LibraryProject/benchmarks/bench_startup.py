@@ -0,0 +1,80 @@
+# benchmarks/bench_startup.py
+"""
+Cold start time of a worker.
+
+Starts --runs fresh interpreters. Each one times `import app`, create_app()
+and the lifespan startup plus the first request (GET /login through the
+ASGI app), and the medians are printed:
+
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --runs 20 --in-memory
+
+--in-memory uses mongomock-motor, as in bench_routes, for runs without a
+mongod. Exits non-zero if the median time to the first response exceeds
+--budget-ms.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+
+async def child(in_memory: bool):
+    timings = {}
+    started = time.perf_counter()
+    if in_memory:
+        from benchmarks.bench_routes import use_in_memory_client
+        use_in_memory_client()
+    import app as app_module
+    timings["import_ms"] = (time.perf_counter() - started) * 1000
+
+    mark = time.perf_counter()
+    app = app_module.create_app()
+    timings["create_app_ms"] = (time.perf_counter() - mark) * 1000
+
+    import httpx
+
+    mark = time.perf_counter()
+    async with app.router.lifespan_context(app):
+        timings["lifespan_ms"] = (time.perf_counter() - mark) * 1000
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+            response = await http.get("/login")
+        timings["first_response_ms"] = (time.perf_counter() - started) * 1000
+        timings["status"] = response.status_code
+    print(json.dumps(timings))
+
+
+def main(args):
+    command = [sys.executable, "-m", "benchmarks.bench_startup", "--child"]
+    if args.in_memory:
+        command.append("--in-memory")
+    runs = []
+    for _ in range(args.runs):
+        output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+
+    for key in ("import_ms", "create_app_ms", "lifespan_ms", "first_response_ms"):
+        values = [run[key] for run in runs]
+        print(f"{key:18} median={statistics.median(values):8.1f} min={min(values):8.1f} max={max(values):8.1f}")
+    median = statistics.median(run["first_response_ms"] for run in runs)
+    if median > args.budget_ms:
+        print(f"Median time to first response {median:.1f}ms is over the {args.budget_ms}ms budget")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--budget-ms", type=float, default=2000.0)
+    parser.add_argument("--in-memory", action="store_true")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        asyncio.run(child(args.in_memory))
+    else:
+        sys.exit(main(args))
@@ -0,0 +1,113 @@
+# benchmarks/bench_streaming.py
+"""
+Time-to-first-byte and peak memory of the streamed /rents-list page.
+
+Seeds a synthetic Histories collection in steps and fetches the admin rent
+list at each size. The ASGI app is called directly and the first
+http.response.body message is timed as it is sent (an HTTP client in
+between, such as httpx's ASGI transport, would collect the whole body
+first). With streaming, TTFB and peak Python memory should stay flat while
+total time grows with the row count.
+
+    MONGO_DB_NAME=LibraryBench python -m benchmarks.bench_streaming
+"""
+import argparse
+import asyncio
+import sys
+import time
+import tracemalloc
+from datetime import timedelta
+
+from pymongo import ReturnDocument
+
+from app import app
+from auth import create_access_token
+from config import MONGO_DB_NAME
+from db import books_collection, histories_collection, users_collection
+
+ADMIN_EMAIL = "bench-admin@example.com"
+
+
+async def seed_admin():
+    await users_collection.update_one(
+        {"emailUser": ADMIN_EMAIL},
+        {"$set": {"emailUser": ADMIN_EMAIL, "is_admin": True, "nameUser": "Bench"}},
+        upsert=True,
+    )
+    return await users_collection.find_one({"emailUser": ADMIN_EMAIL})
+
+
+async def grow_histories(user_id, book_id, target: int):
+    missing = target - await histories_collection.count_documents({"user_id": user_id})
+    while missing > 0:
+        batch = min(missing, 10000)
+        await histories_collection.insert_many([
+            {"user_id": user_id, "book_id": book_id, "dateLoan": "2024-01-01 00:00:00",
+             "dateReturn": "2024-02-01 00:00:00", "isReturned": True}
+            for _ in range(batch)
+        ])
+        missing -= batch
+
+
+async def measure(token: str):
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "scheme": "http",
+        "method": "GET", "path": "/rents-list", "raw_path": b"/rents-list", "query_string": b"", "root_path": "",
+        "headers": [(b"host", b"bench"), (b"cookie", f"access_token={token}".encode())],
+        "client": ("127.0.0.1", 0), "server": ("bench", 80),
+    }
+    requested = False
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        # The client never disconnects
+        await asyncio.Event().wait()
+
+    result = {"status": None, "ttfb": None, "size": 0, "messages": 0}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            result["status"] = message["status"]
+        elif message["type"] == "http.response.body":
+            body = message.get("body", b"")
+            if body and result["ttfb"] is None:
+                result["ttfb"] = time.perf_counter() - started
+            result["size"] += len(body)
+            result["messages"] += 1
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    await app(scope, receive, send)
+    total = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, total, peak
+
+
+async def main(args):
+    admin = await seed_admin()
+    book = await books_collection.find_one_and_update(
+        {"nameBook": "Bench book"},
+        {"$set": {"nameBook": "Bench book", "yearBook": 2000, "availableBook": 1}},
+        upsert=True, return_document=ReturnDocument.AFTER,
+    )
+    token = create_access_token({"sub": ADMIN_EMAIL}, expires_delta=timedelta(minutes=30))
+    for rows in args.sizes:
+        await grow_histories(admin["_id"], book["_id"], rows)
+        result, total, peak = await measure(token)
+        if result["status"] != 200:
+            sys.exit(f"/rents-list answered {result['status']}")
+        print(f"rows={rows:<8} ttfb={result['ttfb'] * 1000:8.1f}ms total={total:7.2f}s "
+              f"peak_mem={peak / 2**20:7.1f}MiB body={result['size'] / 2**20:7.1f}MiB chunks={result['messages']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    args = parser.parse_args()
+    if MONGO_DB_NAME == "LibraryProject":
+        parser.error("the benchmark writes users and rents: set MONGO_DB_NAME to a scratch database")
+    asyncio.run(main(args))
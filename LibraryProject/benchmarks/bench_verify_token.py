@@ -0,0 +1,44 @@
+# benchmarks/bench_verify_token.py
+"""
+Microbenchmark of authenticate_user with and without the decoded-token cache.
+Needs SECRET_KEY but no database.
+
+    python -m benchmarks.bench_verify_token
+"""
+import argparse
+import time
+from datetime import timedelta
+
+from starlette.requests import Request
+
+import auth
+
+
+def make_request(token: str):
+    return Request({"type": "http", "headers": [(b"cookie", f"access_token={token}".encode())]})
+
+
+def run(label, authenticate, request, calls):
+    started = time.perf_counter()
+    for _ in range(calls):
+        authenticate(request)
+    elapsed = time.perf_counter() - started
+    print(f"{label:10} {calls / elapsed:12.0f} calls/s ({elapsed / calls * 1e6:.2f} us/call)")
+
+
+def uncached(request):
+    return auth.decode_token(request.cookies.get("access_token"))
+
+
+def main(args):
+    token = auth.create_access_token({"sub": "bench@example.com"}, expires_delta=timedelta(minutes=30))
+    request = make_request(token)
+    run("uncached", uncached, request, args.calls)
+    run("cached", auth.authenticate_user, request, args.calls)
+    print(auth.token_cache.stats())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=100000)
+    main(parser.parse_args())
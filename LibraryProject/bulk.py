@@ -0,0 +1,40 @@
+# bulk.py
+from pymongo.errors import BulkWriteError
+
+from config import BULK_CHUNK_SIZE
+
+
+async def bulk_insert(collection, documents: list, chunk_size: int = BULK_CHUNK_SIZE):
+    """
+    Insert documents with unordered insert_many calls of `chunk_size`.
+
+    A failing document does not stop the rest of its chunk or the chunks
+    after it. Returns (inserted_ids, errors) where each error is
+    {"index": position in `documents`, "error": message}.
+    """
+    inserted_ids = []
+    errors = []
+    for offset in range(0, len(documents), chunk_size):
+        chunk = documents[offset:offset + chunk_size]
+        try:
+            result = await collection.insert_many(chunk, ordered=False)
+            inserted_ids.extend(result.inserted_ids)
+        except BulkWriteError as e:
+            failed = set()
+            for error in e.details.get("writeErrors", []):
+                failed.add(error["index"])
+                errors.append({"index": offset + error["index"], "error": error["errmsg"]})
+            # insert_many assigns _id to every document before sending it
+            inserted_ids.extend(doc["_id"] for index, doc in enumerate(chunk) if index not in failed)
+    return inserted_ids, errors
+
+
+def bulk_result(inserted_ids: list, errors: list) -> dict:
+    """
+    Response body of the bulk POST endpoints (ObjectIds are left for BSONJSONResponse).
+    """
+    return {
+        "inserted": len(inserted_ids),
+        "inserted_ids": inserted_ids,
+        "errors": errors,
+    }
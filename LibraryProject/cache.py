@@ -0,0 +1,181 @@
+# cache.py
+import hashlib
+import time
+from collections import OrderedDict
+from threading import Lock
+
+from fastapi import Request, Response
+
+from compression import ENCODINGS, coded_etag
+from config import RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL, SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL
+from responses import dumps
+
+# Every named cache registers itself here so its counters can be reported
+caches = {}
+
+
+class TTLCache:
+    """
+    Bounded LRU cache whose entries also expire after a time-to-live.
+    Keeps hit/miss/eviction counters for monitoring. With maxsize=None
+    entries are only ever dropped once expired.
+    """
+
+    def __init__(self, name: str, maxsize: int = 1024, ttl: float = 60):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._sweep_at = 1024
+        self._lock = Lock()
+        caches[name] = self
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl: float = None):
+        """
+        Store a value. `ttl` overrides the cache default for this entry.
+        """
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            if self.maxsize is None:
+                self._sweep()
+            while self.maxsize is not None and len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def _sweep(self):
+        # Unbounded: drop expired entries whenever the size has doubled
+        # since the last sweep, so the work stays amortised O(1) per set
+        if len(self._data) < self._sweep_at:
+            return
+        now = time.monotonic()
+        for key in [key for key, (_, expires_at) in self._data.items() if expires_at <= now]:
+            del self._data[key]
+        self._sweep_at = max(2 * len(self._data), 1024)
+
+    def pop(self, key):
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return entry[0] if entry else None
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def discard_if(self, predicate):
+        """
+        Drop every entry whose value satisfies `predicate`.
+        """
+        with self._lock:
+            for key in [key for key, (value, _) in self._data.items() if predicate(value)]:
+                del self._data[key]
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class CollectionVersions:
+    """
+    Per-collection change counters. Write handlers bump the collections they
+    touch; anything cached against an older version is rebuilt. Listeners
+    (see invalidation.py) hear about bumps made by this process.
+    """
+
+    def __init__(self):
+        self._versions = {}
+        self._changed_at = {}
+        self.listeners = []
+
+    def bump(self, *collections: str, notify: bool = True):
+        now = time.monotonic()
+        for collection in collections:
+            self._versions[collection] = self._versions.get(collection, 0) + 1
+            self._changed_at[collection] = now
+            if notify:
+                for listener in self.listeners:
+                    listener(collection)
+
+    def current(self, *collections: str) -> tuple:
+        return tuple(self._versions.get(collection, 0) for collection in collections)
+
+    def quiet_for(self, seconds: float, *collections: str) -> bool:
+        """
+        True when none of `collections` has been bumped in the last `seconds`.
+        """
+        changed_at = max((self._changed_at.get(collection, float("-inf")) for collection in collections),
+                         default=float("-inf"))
+        return time.monotonic() - changed_at > seconds
+
+
+versions = CollectionVersions()
+response_cache = TTLCache("responses", maxsize=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL)
+search_cache = TTLCache("search", maxsize=SEARCH_CACHE_SIZE, ttl=SEARCH_CACHE_TTL)
+
+
+def etag_matches(if_none_match: str, etag: str, encodings: tuple = ()):
+    """
+    The tag in If-None-Match that matches `etag`, or None. With `encodings`,
+    the content-coded variants of `etag` that the compression middleware
+    sends (e.g. "<digest>-gzip") match too.
+    """
+    if not if_none_match:
+        return None
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    if "*" in tags:
+        return etag
+    for candidate in (etag, *(coded_etag(etag, encoding) for encoding in encodings)):
+        if candidate in tags:
+            return candidate
+    return None
+
+
+async def cached_json_response(request: Request, key: str, collections: tuple, build, cache: TTLCache = response_cache):
+    """
+    Serve a JSON body from `cache` while none of `collections` has changed,
+    calling `build()` (a coroutine function) only on a miss.
+    The ETag is a digest of the body, so it is strong and identical across
+    workers; a matching If-None-Match (of any coding) gets an empty 304.
+    """
+    version = versions.current(*collections)
+    entry = cache.get(key)
+    if entry is None or entry[0] != version:
+        body = dumps(await build())
+        entry = (version, body, '"%s"' % hashlib.sha256(body).hexdigest()[:32])
+        cache.set(key, entry)
+
+    _, body, etag = entry
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    matched = etag_matches(request.headers.get("if-none-match"), etag, ENCODINGS)
+    if matched:
+        # Echo the variant the client holds; a 304 is never compressed
+        headers["ETag"] = matched
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,217 @@
+# catalog.py
+import re
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException, Query, status
+from pymongo import UpdateOne
+
+from config import CATALOG_PAGE_SIZE, CATALOG_MAX_PAGE_SIZE, SEARCH_PAGE_SIZE, AUTOCOMPLETE_LIMIT
+from db import books_collection, authors_collection, categories_collection
+
+# Books embed the names of their category and author (the catalog read
+# model), so listing the catalog is a single indexed find. The helpers
+# below keep those names current on every write to Books, Authors and
+# Categories; `python catalog.py --rebuild` regenerates them from scratch.
+# nameLower, the lowercased title, backs prefix autocomplete.
+
+CATALOG_FIELDS = {"_id": 1, "nameBook": 1, "yearBook": 1, "availableBook": 1, "categoryName": 1, "authorName": 1}
+AUTOCOMPLETE_FIELDS = {"_id": 1, "nameBook": 1, "authorName": 1}
+
+
+def _object_id(value: str, name: str):
+    try:
+        return ObjectId(value)
+    except (InvalidId, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid {name}")
+
+
+def catalog_params(
+    after: str = Query(None, description="Cursor: _id of the last book on the previous page"),
+    limit: int = Query(CATALOG_PAGE_SIZE, ge=1, le=CATALOG_MAX_PAGE_SIZE),
+    category: str = Query(None, description="Category _id"),
+    author: str = Query(None, description="Author _id"),
+    year: int = Query(None),
+    available: bool = Query(None, description="Only books in stock (true) or out of stock (false)"),
+):
+    """
+    Query parameters shared by the HTML and JSON catalog routes.
+    """
+    match = {}
+    if category:
+        match["category_id"] = _object_id(category, "category")
+    if author:
+        match["author_id"] = _object_id(author, "author")
+    if year is not None:
+        match["yearBook"] = year
+    if available is not None:
+        match["availableBook"] = {"$gt": 0} if available else {"$lte": 0}
+    if after:
+        match["_id"] = {"$gt": _object_id(after, "cursor")}
+    return {"match": match, "limit": limit}
+
+
+async def catalog_page(match: dict, limit: int, books_source=books_collection):
+    """
+    One page of the catalog in _id order, using keyset pagination.
+
+    Filters and the cursor go straight into an indexed find on Books, so
+    the cost of a page does not depend on the size of the catalog.
+    `books_source` is the Books handle to read (see db.read_db).
+    Returns (books, next_cursor); next_cursor is None on the last page.
+    """
+    # Books whose author is gone are hidden, as the old $unwind on the author did
+    query = {**match, "authorName": {"$exists": True}}
+    books = await books_source.find(query, CATALOG_FIELDS).sort("_id", 1).limit(limit + 1).to_list(length=None)
+
+    next_cursor = None
+    if len(books) > limit:
+        books = books[:limit]
+        next_cursor = str(books[-1]["_id"])
+    return books, next_cursor
+
+
+async def search_books(text: str, page: int = 1, limit: int = SEARCH_PAGE_SIZE, books_source=books_collection):
+    """
+    Full-text search over titles, author and category names (the catalog_text
+    index, which weights a title match highest), best matches first.
+    Returns (books, next_page); next_page is None on the last page.
+    """
+    query = {"$text": {"$search": text}, "authorName": {"$exists": True}}
+    score = {"score": {"$meta": "textScore"}}
+    books = await books_source.find(query, {**CATALOG_FIELDS, **score}) \
+        .sort([("score", {"$meta": "textScore"}), ("_id", 1)]) \
+        .skip((page - 1) * limit).limit(limit + 1).to_list(length=None)
+    return _page(books, page, limit)
+
+
+async def autocomplete(prefix: str, page: int = 1, limit: int = AUTOCOMPLETE_LIMIT, books_source=books_collection):
+    """
+    Titles starting with `prefix` (case-insensitive), in title order.
+    An anchored regex on nameLower is a bounded scan of the nameLower index.
+    Returns (books, next_page).
+    """
+    query = {"nameLower": {"$regex": "^" + re.escape(search_key(prefix))}, "authorName": {"$exists": True}}
+    books = await books_source.find(query, AUTOCOMPLETE_FIELDS).sort("nameLower", 1) \
+        .skip((page - 1) * limit).limit(limit + 1).to_list(length=None)
+    return _page(books, page, limit)
+
+
+def _page(books: list, page: int, limit: int):
+    if len(books) > limit:
+        return books[:limit], page + 1
+    return books, None
+
+
+def search_key(name) -> str:
+    return str(name).lower()
+
+
+def author_name(author: dict):
+    return f"{author['nameAuthor']} {author['surnameAuthor']}"
+
+
+async def denormalize_books(books: list):
+    """
+    Add categoryName, authorName and nameLower to book documents about to be written.
+    Looks up all referenced authors and categories in two queries.
+    """
+    author_ids = {book["author_id"] for book in books if "author_id" in book}
+    category_ids = {book["category_id"] for book in books if "category_id" in book}
+    authors = {
+        author["_id"]: author_name(author)
+        async for author in authors_collection.find({"_id": {"$in": list(author_ids)}})
+    }
+    categories = {}
+    async for category in categories_collection.find({"_id": {"$in": list(category_ids)}}):
+        categories.setdefault(category["_id"], []).append(category["nameCategory"])
+
+    for book in books:
+        if "nameBook" in book:
+            book["nameLower"] = search_key(book["nameBook"])
+        book["categoryName"] = categories.get(book.get("category_id"), [])
+        if book.get("author_id") in authors:
+            book["authorName"] = authors[book["author_id"]]
+        else:
+            book.pop("authorName", None)
+    return books
+
+
+async def refresh_authors(author_ids: list):
+    """
+    Re-embed the names of these authors in their books, removing the name
+    from books whose author no longer exists.
+    """
+    # Only touch authors that actually have books (usually none for new ones)
+    author_ids = await books_collection.distinct("author_id", {"author_id": {"$in": list(author_ids)}})
+    authors = {
+        author["_id"]: author_name(author)
+        async for author in authors_collection.find({"_id": {"$in": list(author_ids)}})
+    }
+    for author_id in author_ids:
+        if author_id in authors:
+            await books_collection.update_many({"author_id": author_id}, {"$set": {"authorName": authors[author_id]}})
+        else:
+            await books_collection.update_many({"author_id": author_id}, {"$unset": {"authorName": ""}})
+
+
+async def refresh_categories(category_ids: list):
+    """
+    Re-embed the names of these categories in their books.
+    """
+    category_ids = await books_collection.distinct("category_id", {"category_id": {"$in": list(category_ids)}})
+    categories = {category_id: [] for category_id in category_ids}
+    async for category in categories_collection.find({"_id": {"$in": list(category_ids)}}):
+        categories[category["_id"]].append(category["nameCategory"])
+    for category_id, names in categories.items():
+        await books_collection.update_many({"category_id": category_id}, {"$set": {"categoryName": names}})
+
+
+async def rebuild_catalog(batch_size: int = 1000):
+    """
+    Recompute the embedded names of every book with one server-side pass,
+    then backfill nameLower where it is missing or out of date.
+    """
+    await books_collection.aggregate([
+        {"$lookup": {"from": "Categories", "localField": "category_id", "foreignField": "_id", "as": "category"}},
+        {"$lookup": {"from": "Authors", "localField": "author_id", "foreignField": "_id", "as": "author"}},
+        {"$project": {
+            "categoryName": "$category.nameCategory",
+            "authorName": {"$let": {
+                "vars": {"author": {"$arrayElemAt": ["$author", 0]}},
+                "in": {"$cond": [
+                    {"$ifNull": ["$$author", False]},
+                    {"$concat": ["$$author.nameAuthor", " ", "$$author.surnameAuthor"]},
+                    "$$REMOVE"
+                ]}
+            }}
+        }},
+        {"$merge": {
+            "into": "Books",
+            "on": "_id",
+            # A missing authorName in $$new removes the stale one
+            "whenMatched": [{"$set": {"categoryName": "$$new.categoryName", "authorName": "$$new.authorName"}}],
+            "whenNotMatched": "discard"
+        }}
+    ]).to_list(length=None)
+
+    # Lowercased in Python, like denormalize_books: $toLower is ASCII-only
+    updates = []
+    async for book in books_collection.find({"nameBook": {"$exists": True}}, {"nameBook": 1, "nameLower": 1}):
+        if book.get("nameLower") != search_key(book["nameBook"]):
+            updates.append(UpdateOne({"_id": book["_id"]}, {"$set": {"nameLower": search_key(book["nameBook"])}}))
+        if len(updates) >= batch_size:
+            await books_collection.bulk_write(updates, ordered=False)
+            updates = []
+    if updates:
+        await books_collection.bulk_write(updates, ordered=False)
+
+
+if __name__ == "__main__":
+    import asyncio
+    import sys
+
+    if "--rebuild" not in sys.argv:
+        sys.exit("usage: python catalog.py --rebuild")
+    asyncio.run(rebuild_catalog())
+    print("Catalog rebuilt.")
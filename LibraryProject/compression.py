@@ -0,0 +1,169 @@
+# compression.py
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from config import COMPRESSION_MIN_SIZE, COMPRESSION_GZIP_LEVEL, COMPRESSION_ZSTD_LEVEL, COMPRESSION_FLUSH_SIZE
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional, gzip is always available
+    zstandard = None
+
+# Content codings the middleware may apply, best first
+ENCODINGS = ("zstd", "gzip")
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/x-ndjson", "application/javascript", "image/svg+xml")
+
+
+class _Gzip:
+    encoding = "gzip"
+
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+class _Zstd:
+    encoding = "zstd"
+
+    def __init__(self, level: int):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        flush_mode = zstandard.COMPRESSOBJ_FLUSH_FINISH if final else zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        return self._compressor.compress(data) + self._compressor.flush(flush_mode)
+
+
+def accepted_encodings(accept_encoding: str) -> set:
+    """
+    The codings an Accept-Encoding header allows, leaving out those with q=0.
+    """
+    accepted = set()
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(name.strip())
+    return accepted
+
+
+def choose_encoding(accept_encoding: str):
+    """
+    Pick zstd (when installed) or gzip from an Accept-Encoding header, honouring q=0.
+    """
+    accepted = accepted_encodings(accept_encoding)
+    if zstandard is not None and "zstd" in accepted:
+        return "zstd"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+def coded_etag(etag: str, encoding: str) -> str:
+    """
+    The strong ETag of the `encoding` variant of a body: each content coding
+    needs its own validator. Weak tags are shared across codings.
+    """
+    if not etag.startswith('"'):
+        return etag
+    return f'{etag[:-1]}-{encoding}"'
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing text responses with zstd or gzip.
+
+    Bodies under `minimum_size` are sent as is. Streamed bodies are
+    compressed as they go and flushed every `flush_size` bytes of input, so
+    streamed pages keep a low time-to-first-byte. Responses that already
+    carry a Content-Encoding (e.g. precompressed static assets) are left alone.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE, gzip_level: int = COMPRESSION_GZIP_LEVEL,
+                 zstd_level: int = COMPRESSION_ZSTD_LEVEL, flush_size: int = COMPRESSION_FLUSH_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.zstd_level = zstd_level
+        self.flush_size = flush_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        responder = _CompressionResponder(self, encoding, send)
+        await self.app(scope, receive, responder.send)
+
+    def compressor(self, encoding: str):
+        if encoding == "zstd":
+            return _Zstd(self.zstd_level)
+        return _Gzip(self.gzip_level)
+
+
+class _CompressionResponder:
+    def __init__(self, middleware: CompressionMiddleware, encoding: str, send):
+        self.middleware = middleware
+        self.encoding = encoding
+        self._send = send
+        self.start_message = None
+        self.compressor = None
+        self.passthrough = False
+        self.buffer = b""
+
+    async def send(self, message):
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            headers = Headers(raw=message["headers"])
+            content_type = headers.get("content-type", "")
+            self.passthrough = "content-encoding" in headers or not content_type.startswith(COMPRESSIBLE_TYPES)
+            if self.passthrough:
+                await self._send(message)
+            return
+
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.start_message is not None:
+            # First body chunk: decide whether to compress at all
+            start_message, self.start_message = self.start_message, None
+            if not more_body and len(body) < self.middleware.minimum_size:
+                self.passthrough = True
+                await self._send(start_message)
+                await self._send(message)
+                return
+
+            self.compressor = self.middleware.compressor(self.encoding)
+            headers = MutableHeaders(raw=start_message["headers"])
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            if "etag" in headers:
+                headers["ETag"] = coded_etag(headers["etag"], self.encoding)
+            if not more_body:
+                compressed = self.compressor.compress(body, final=True)
+                headers["Content-Length"] = str(len(compressed))
+                await self._send(start_message)
+                await self._send({"type": "http.response.body", "body": compressed})
+                return
+            del headers["Content-Length"]
+            await self._send(start_message)
+
+        # Streaming: batch small chunks so each flush still compresses well
+        self.buffer += body
+        if more_body and len(self.buffer) < self.middleware.flush_size:
+            return
+        data, self.buffer = self.buffer, b""
+        await self._send({
+            "type": "http.response.body",
+            "body": self.compressor.compress(data, final=not more_body),
+            "more_body": more_body,
+        })
@@ -11,3 +11,90 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 30
 username = os.getenv('MONGO_USERNAME')
 password = os.getenv('MONGO_PASSWORD')
 uri = os.getenv('MONGO_URI')
+
+MONGO_DB_NAME = os.getenv('MONGO_DB_NAME', 'LibraryProject')
+
+# MongoDB connection pool (see db.py); compressors e.g. "zstd,zlib"
+MONGO_MAX_POOL_SIZE = int(os.getenv('MONGO_MAX_POOL_SIZE', 100))
+MONGO_MIN_POOL_SIZE = int(os.getenv('MONGO_MIN_POOL_SIZE', 0))
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv('MONGO_MAX_IDLE_TIME_MS', 300000))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv('MONGO_WAIT_QUEUE_TIMEOUT_MS', 10000))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv('MONGO_SERVER_SELECTION_TIMEOUT_MS', 30000))
+MONGO_COMPRESSORS = os.getenv('MONGO_COMPRESSORS', '')
+MONGO_WARMUP_CONNECTIONS = int(os.getenv('MONGO_WARMUP_CONNECTIONS', 4))
+
+# Read routing: catalog and report reads may use secondaries lagging by at
+# most MONGO_MAX_STALENESS_SECONDS (90 is MongoDB's minimum); rent/return
+# runs in a causally consistent session
+MONGO_SECONDARY_READS = os.getenv('MONGO_SECONDARY_READS', 'true').lower() == 'true'
+MONGO_MAX_STALENESS_SECONDS = int(os.getenv('MONGO_MAX_STALENESS_SECONDS', 90))
+MONGO_CAUSAL_SESSIONS = os.getenv('MONGO_CAUSAL_SESSIONS', 'true').lower() == 'true'
+
+# Cross-worker cache invalidation (see invalidation.py):
+# auto | change_streams | poll | off
+INVALIDATION_MODE = os.getenv('INVALIDATION_MODE', 'auto')
+INVALIDATION_POLL_INTERVAL = float(os.getenv('INVALIDATION_POLL_INTERVAL', 1.0))
+INVALIDATION_LOG_SIZE = int(os.getenv('INVALIDATION_LOG_SIZE', 1048576))
+
+# Authenticated-principal cache (see auth.load_principal)
+PRINCIPAL_CACHE_SIZE = int(os.getenv('PRINCIPAL_CACHE_SIZE', 4096))
+PRINCIPAL_CACHE_TTL = int(os.getenv('PRINCIPAL_CACHE_TTL', 60))
+
+# Run rent/return inside a multi-document transaction (needs a replica set)
+RENT_TRANSACTIONS = os.getenv('RENT_TRANSACTIONS', 'false').lower() == 'true'
+
+# Catalog pagination
+CATALOG_PAGE_SIZE = int(os.getenv('CATALOG_PAGE_SIZE', 50))
+CATALOG_MAX_PAGE_SIZE = int(os.getenv('CATALOG_MAX_PAGE_SIZE', 500))
+
+# Catalog search (see catalog.search_books)
+SEARCH_PAGE_SIZE = int(os.getenv('SEARCH_PAGE_SIZE', 20))
+SEARCH_MAX_PAGE = int(os.getenv('SEARCH_MAX_PAGE', 50))
+AUTOCOMPLETE_LIMIT = int(os.getenv('AUTOCOMPLETE_LIMIT', 10))
+# Search responses have their own cache: one entry per query string (and
+# per keystroke of autocomplete) would otherwise evict the reference data
+SEARCH_CACHE_SIZE = int(os.getenv('SEARCH_CACHE_SIZE', 2048))
+SEARCH_CACHE_TTL = int(os.getenv('SEARCH_CACHE_TTL', 60))
+
+# Rows fetched per cursor batch while streaming HTML pages, and characters
+# of rendered HTML grouped into each chunk sent to the client
+HTML_STREAM_BATCH_SIZE = int(os.getenv('HTML_STREAM_BATCH_SIZE', 500))
+HTML_STREAM_CHUNK_SIZE = int(os.getenv('HTML_STREAM_CHUNK_SIZE', 16384))
+
+# Documents per cursor batch for NDJSON streaming of /api/rents
+RENTS_STREAM_BATCH_SIZE = int(os.getenv('RENTS_STREAM_BATCH_SIZE', 1000))
+
+# Cached JSON responses of reference data and the catalog API (see cache.cached_json_response)
+RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', 512))
+RESPONSE_CACHE_TTL = int(os.getenv('RESPONSE_CACHE_TTL', 300))
+
+# Documents per insert_many call in the bulk POST endpoints
+BULK_CHUNK_SIZE = int(os.getenv('BULK_CHUNK_SIZE', 1000))
+
+# bcrypt process pool (see hashing.py); 0 workers runs bcrypt in the threadpool
+HASH_POOL_SIZE = int(os.getenv('HASH_POOL_SIZE', 2))
+HASH_QUEUE_LIMIT = int(os.getenv('HASH_QUEUE_LIMIT', 32))
+
+# Decoded-JWT cache (see auth.verify_token); entries never outlive the token's exp
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', 10000))
+TOKEN_CACHE_TTL = int(os.getenv('TOKEN_CACHE_TTL', ACCESS_TOKEN_EXPIRE_MINUTES * 60))
+
+# Jinja: re-check template files on every render (development only) and where to keep compiled bytecode
+TEMPLATES_AUTO_RELOAD = os.getenv('TEMPLATES_AUTO_RELOAD', 'false').lower() == 'true'
+TEMPLATE_BYTECODE_CACHE_DIR = os.getenv('TEMPLATE_BYTECODE_CACHE_DIR')
+
+# Cache-Control max-age (seconds) of long-lived static assets such as the favicon
+STATIC_MAX_AGE = int(os.getenv('STATIC_MAX_AGE', 7 * 24 * 3600))
+
+# Response compression (see compression.py); zstd is used when the zstandard package is installed
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', 1024))
+COMPRESSION_GZIP_LEVEL = int(os.getenv('COMPRESSION_GZIP_LEVEL', 6))
+COMPRESSION_ZSTD_LEVEL = int(os.getenv('COMPRESSION_ZSTD_LEVEL', 3))
+COMPRESSION_FLUSH_SIZE = int(os.getenv('COMPRESSION_FLUSH_SIZE', 16384))
+
+# Histories archival (see archive.py)
+ARCHIVE_AFTER_DAYS = int(os.getenv('ARCHIVE_AFTER_DAYS', 90))
+ARCHIVE_BATCH_SIZE = int(os.getenv('ARCHIVE_BATCH_SIZE', 1000))
+
+# Instrumentation (see metrics.py)
+METRICS_ROUND_TRIP_HEADER = os.getenv('METRICS_ROUND_TRIP_HEADER', 'false').lower() == 'true'
@@ -1,23 +1,137 @@
 # db.py
-import os
-from dotenv import load_dotenv
-from pymongo.mongo_client import MongoClient
+import asyncio
+from contextlib import asynccontextmanager
+from functools import lru_cache
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.read_preferences import Primary, SecondaryPreferred
 from pymongo.server_api import ServerApi
-from urllib.parse import quote_plus
 
-# MongoDB client setup
-username = quote_plus(os.getenv('MONGO_USERNAME'))
-password = quote_plus(os.getenv('MONGO_PASSWORD'))
-uri = os.getenv('MONGO_URI')
+from config import (
+    uri, MONGO_DB_NAME, MONGO_MAX_POOL_SIZE, MONGO_MIN_POOL_SIZE, MONGO_MAX_IDLE_TIME_MS,
+    MONGO_WAIT_QUEUE_TIMEOUT_MS, MONGO_SERVER_SELECTION_TIMEOUT_MS, MONGO_COMPRESSORS, MONGO_WARMUP_CONNECTIONS,
+    MONGO_SECONDARY_READS, MONGO_MAX_STALENESS_SECONDS, MONGO_CAUSAL_SESSIONS,
+)
+from cache import versions
+from metrics import command_listener, pool_listener
+
+pool_options = {
+    "maxPoolSize": MONGO_MAX_POOL_SIZE,
+    "minPoolSize": MONGO_MIN_POOL_SIZE,
+    "maxIdleTimeMS": MONGO_MAX_IDLE_TIME_MS,
+    "waitQueueTimeoutMS": MONGO_WAIT_QUEUE_TIMEOUT_MS,
+    "serverSelectionTimeoutMS": MONGO_SERVER_SELECTION_TIMEOUT_MS,
+}
+if MONGO_COMPRESSORS:
+    pool_options["compressors"] = MONGO_COMPRESSORS
+
+
+@lru_cache(maxsize=None)
+def get_client():
+    """
+    The MongoDB client, built on first use. Building it parses the URI (a
+    DNS lookup for mongodb+srv://), so it is kept out of import time.
+    """
+    # Motor wraps pymongo with an asyncio API, so route handlers can await
+    # queries instead of blocking the event loop or Starlette's threadpool.
+    # connect=False: no connection is opened until the lifespan calls connect()
+    return AsyncIOMotorClient(
+        uri,
+        server_api=ServerApi('1'),
+        connect=False,
+        event_listeners=[command_listener, pool_listener],
+        **pool_options,
+    )
+
+
+@lru_cache(maxsize=None)
+def get_db():
+    return get_client()[MONGO_DB_NAME]
+
+
+@lru_cache(maxsize=None)
+def get_reporting_db():
+    # Catalog and reporting reads; they may be served by a secondary. To try
+    # it locally, start a one-member replica set (mongod --replSet rs0, then
+    # rs.initiate()) and add ?replicaSet=rs0 to MONGO_URI.
+    return get_client().get_database(
+        MONGO_DB_NAME,
+        read_preference=SecondaryPreferred(max_staleness=MONGO_MAX_STALENESS_SECONDS) if MONGO_SECONDARY_READS
+        else Primary(),
+    )
+
+
+class _Lazy:
+    """
+    Stands in for a Motor client, database or collection and builds it on
+    first use, so modules can keep importing `db`, `books_collection` etc.
+    """
+
+    def __init__(self, build):
+        self._build = lru_cache(maxsize=None)(build)
 
-client = MongoClient(uri, server_api=ServerApi('1'))
+    def __getattr__(self, name):
+        return getattr(self._build(), name)
 
-# Database selection
-db = client['LibraryProject']
+    def __getitem__(self, name):
+        return self._build()[name]
+
+    def __repr__(self):
+        return f"<lazy {self._build()!r}>"
+
+
+client = _Lazy(get_client)
+db = _Lazy(get_db)
+reporting_db = _Lazy(get_reporting_db)
 
 # Collections
-books_collection = db["Books"]
-categories_collection = db["Categories"]
-authors_collection = db["Authors"]
-histories_collection = db["Histories"]
-users_collection = db["Users"]
+books_collection = _Lazy(lambda: get_db()["Books"])
+categories_collection = _Lazy(lambda: get_db()["Categories"])
+authors_collection = _Lazy(lambda: get_db()["Authors"])
+histories_collection = _Lazy(lambda: get_db()["Histories"])
+users_collection = _Lazy(lambda: get_db()["Users"])
+
+
+def read_db(*collections: str):
+    """
+    The database to read `collections` from for a cacheable response:
+    reporting_db once this process has not written any of them for longer
+    than the staleness bound, otherwise the primary, so a cache entry built
+    right after a write never comes from a secondary that lacks it.
+    """
+    if versions.quiet_for(MONGO_MAX_STALENESS_SECONDS, *collections):
+        return get_reporting_db()
+    return get_db()
+
+
+@asynccontextmanager
+async def causal_session():
+    """
+    A causally consistent session (None when MONGO_CAUSAL_SESSIONS is off).
+    Reads in it see the session's earlier writes, even on a secondary.
+    """
+    if not MONGO_CAUSAL_SESSIONS:
+        yield None
+        return
+    async with await get_client().start_session(causal_consistency=True) as session:
+        yield session
+
+
+async def connect(warmup: int = MONGO_WARMUP_CONNECTIONS):
+    """
+    Reach the deployment and open `warmup` pooled connections, so the first
+    requests do not pay for server selection and connection handshakes.
+    """
+    admin = get_client().admin
+    await admin.command("ping")
+    # Concurrent pings each check out their own connection
+    await asyncio.gather(*(admin.command("ping") for _ in range(max(warmup - 1, 0))))
+
+
+def close():
+    """
+    Close every pooled connection and stop the driver's monitor threads
+    (pymongo reopens them if the client is used again).
+    """
+    if get_client.cache_info().currsize:
+        get_client().close()
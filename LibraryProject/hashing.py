@@ -0,0 +1,113 @@
+# hashing.py
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import bcrypt
+from fastapi import HTTPException, status
+from starlette.concurrency import run_in_threadpool
+
+from config import HASH_POOL_SIZE, HASH_QUEUE_LIMIT
+
+# bcrypt costs ~250ms of CPU per call. It runs in a small dedicated process
+# pool so a burst of logins cannot starve the workers serving other routes;
+# once HASH_QUEUE_LIMIT calls are waiting, new ones are refused with 503.
+# HASH_POOL_SIZE=0 falls back to Starlette's threadpool.
+
+_executor = None
+_pending = 0
+
+stats = {
+    "calls": 0,
+    "rejected": 0,
+    "pending": 0,
+    "hash_seconds_total": 0.0,
+    "hash_seconds_max": 0.0,
+    "queue_wait_seconds_total": 0.0,
+    "queue_wait_seconds_max": 0.0,
+}
+
+
+def _checkpw(password: bytes, hashed: bytes):
+    started = time.time()
+    result = bcrypt.checkpw(password, hashed)
+    return result, started, time.time()
+
+
+def _hashpw(password: bytes):
+    started = time.time()
+    result = bcrypt.hashpw(password, bcrypt.gensalt())
+    return result, started, time.time()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        # Not fork: by the first login the Motor executor and pymongo monitor
+        # threads are running, and forking a threaded process can deadlock
+        # the child
+        method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        _executor = ProcessPoolExecutor(max_workers=HASH_POOL_SIZE, mp_context=multiprocessing.get_context(method))
+    return _executor
+
+
+def start():
+    """
+    Start the pool's worker processes in the background, so the first login
+    does not wait for them. Called from the lifespan before the Mongo client
+    connects.
+    """
+    if HASH_POOL_SIZE > 0:
+        executor = _get_executor()
+        for _ in range(HASH_POOL_SIZE):
+            executor.submit(time.time)
+
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def _record(submitted: float, started: float, finished: float):
+    wait = max(started - submitted, 0.0)
+    duration = finished - started
+    stats["calls"] += 1
+    stats["hash_seconds_total"] += duration
+    stats["hash_seconds_max"] = max(stats["hash_seconds_max"], duration)
+    stats["queue_wait_seconds_total"] += wait
+    stats["queue_wait_seconds_max"] = max(stats["queue_wait_seconds_max"], wait)
+
+
+async def _run(fn, *args):
+    global _pending
+    if _pending >= HASH_QUEUE_LIMIT:
+        stats["rejected"] += 1
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many login attempts in progress, try again shortly",
+            headers={"Retry-After": "1"},
+        )
+    _pending += 1
+    stats["pending"] = _pending
+    submitted = time.time()
+    try:
+        if HASH_POOL_SIZE > 0:
+            result, started, finished = await asyncio.get_running_loop().run_in_executor(_get_executor(), fn, *args)
+        else:
+            result, started, finished = await run_in_threadpool(fn, *args)
+    finally:
+        _pending -= 1
+        stats["pending"] = _pending
+    _record(submitted, started, finished)
+    return result
+
+
+async def check_password(password: str, hashed: str) -> bool:
+    return await _run(_checkpw, password.encode('utf-8'), hashed.encode('utf-8'))
+
+
+async def hash_password(password: str) -> str:
+    return (await _run(_hashpw, password.encode('utf-8'))).decode('utf-8')
@@ -0,0 +1,198 @@
+# indexes.py
+"""
+Index bootstrap and query-plan verification.
+
+`ensure_indexes` runs at application startup. Running this module directly
+creates the indexes, and with --verify it also explains every query shape
+used in routes.py and exits non-zero if any of them scans a collection.
+"""
+import asyncio
+import logging
+import sys
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+INDEXES = {
+    "Users": [
+        IndexModel([("emailUser", ASCENDING)], name="emailUser_unique", unique=True),
+    ],
+    "Histories": [
+        # At most one open rent per user and book
+        IndexModel([("user_id", ASCENDING), ("book_id", ASCENDING)], name="user_book_open_unique",
+                   unique=True, partialFilterExpression={"isReturned": False}),
+        IndexModel([("user_id", ASCENDING), ("isReturned", ASCENDING), ("dateLoan", DESCENDING)],
+                   name="user_rents_sorted"),
+        IndexModel([("isReturned", ASCENDING), ("dateLoan", DESCENDING)], name="rents_sorted"),
+        # Selection of returned rents for archival (archive.py)
+        IndexModel([("isReturned", ASCENDING), ("dateReturn", ASCENDING)], name="returned_dateReturn"),
+        # Incremental sync of /api/rents (`since` matches either date)
+        IndexModel([("dateLoan", ASCENDING)], name="dateLoan"),
+        IndexModel([("dateReturn", ASCENDING)], name="dateReturn"),
+    ],
+    "Books": [
+        # Catalog filters followed by the keyset sort on _id
+        IndexModel([("category_id", ASCENDING), ("_id", ASCENDING)], name="category_id_id"),
+        IndexModel([("author_id", ASCENDING), ("_id", ASCENDING)], name="author_id_id"),
+        IndexModel([("yearBook", ASCENDING), ("_id", ASCENDING)], name="yearBook_id"),
+        # /books/search: ranked full-text search and title autocomplete
+        IndexModel([("nameBook", TEXT), ("authorName", TEXT), ("categoryName", TEXT)], name="catalog_text",
+                   weights={"nameBook": 10, "authorName": 5, "categoryName": 2}, default_language="none"),
+        IndexModel([("nameLower", ASCENDING)], name="nameLower",
+                   partialFilterExpression={"authorName": {"$exists": True}}),
+    ],
+    "Categories": [
+        IndexModel([("nameCategory", ASCENDING)], name="nameCategory"),
+    ],
+}
+
+
+async def ensure_indexes(db):
+    """
+    Create every index in INDEXES. Existing indexes are left untouched;
+    a failure (e.g. duplicate emails blocking the unique index) is logged
+    so the application can still start.
+    """
+    for collection, models in INDEXES.items():
+        try:
+            await db[collection].create_indexes(models)
+        except OperationFailure as e:
+            logger.error("Could not create indexes on %s: %s", collection, e)
+
+
+def query_shapes(db):
+    """
+    Every query issued by routes.py, as (label, coroutine factory returning
+    explain output, allow_collscan). Unfiltered reads of small reference
+    collections are allowed to scan. Date-range shapes include the archive
+    buckets that exist when the check runs.
+    """
+    some_id = ObjectId()
+    rent_lookups = [
+        {"$lookup": {"from": "Users", "localField": "user_id", "foreignField": "_id", "as": "user"}},
+        {"$lookup": {"from": "Books", "localField": "book_id", "foreignField": "_id", "as": "book"}},
+    ]
+    # Incremental sync of /api/rents: oldest change first, with a limit
+    since = {"$or": [{"dateLoan": {"$gte": "2024-01-01"}}, {"dateReturn": {"$gte": "2024-01-01"}}]}
+    since_order = [
+        {"$addFields": {"changedAt": {"$max": ["$dateLoan", "$dateReturn"]}}},
+        {"$sort": {"changedAt": 1, "_id": 1}},
+        {"$limit": 100},
+    ]
+
+    def find(collection, filter, sort=None):
+        cursor = db[collection].find(filter)
+        if sort:
+            cursor = cursor.sort(sort)
+        return lambda: cursor.explain()
+
+    def catalog(match):
+        return find("Books", {**match, "authorName": {"$exists": True}}, sort=[("_id", ASCENDING)])
+
+    def aggregate(collection, pipeline):
+        return lambda: db.command("aggregate", collection, pipeline=pipeline, explain=True)
+
+    def rents_in_range(match):
+        # The stages /rents-list and /api/rents run for a date range: the
+        # dateLoan match on Histories and a $unionWith per archive bucket
+        async def explain():
+            from archive import history_stages
+
+            stages = await history_stages(match, "2024-01-01", "2024-03-31")
+            pipeline = [*stages, {"$sort": {"isReturned": 1, "dateLoan": -1}}, *rent_lookups]
+            return await db.command("aggregate", "Histories", pipeline=pipeline, explain=True)
+        return explain
+
+    return [
+        ("Users by email", find("Users", {"emailUser": "someone@example.com"}), False),
+        ("Books by id", find("Books", {"_id": some_id}), False),
+        ("Open rent of user and book",
+         find("Histories", {"user_id": some_id, "book_id": some_id, "isReturned": False}), False),
+        ("Category by name", find("Categories", {"nameCategory": "Child"}), False),
+        ("Catalog page", catalog({"_id": {"$gt": some_id}}), False),
+        ("Catalog by category", catalog({"category_id": some_id}), False),
+        ("Catalog by author", catalog({"author_id": some_id}), False),
+        ("Catalog by year", catalog({"yearBook": 2000}), False),
+        ("Search", find("Books", {"$text": {"$search": "orwell"}, "authorName": {"$exists": True}}), False),
+        ("Autocomplete", find("Books", {"nameLower": {"$regex": "^anim"}, "authorName": {"$exists": True}},
+                              sort=[("nameLower", ASCENDING)]), False),
+        ("All rents", aggregate("Histories", [
+            {"$sort": {"isReturned": 1, "dateLoan": -1}},
+            *rent_lookups,
+        ]), False),
+        ("Rents of user", aggregate("Histories", [
+            {"$match": {"user_id": some_id}},
+            {"$sort": {"isReturned": 1, "dateLoan": -1}},
+            *rent_lookups,
+        ]), False),
+        ("Rents since", aggregate("Histories", [
+            {"$match": since},
+            *since_order,
+            *rent_lookups,
+        ]), False),
+        ("Rents of user since", aggregate("Histories", [
+            {"$match": {**since, "user_id": some_id}},
+            *since_order,
+            *rent_lookups,
+        ]), False),
+        ("Rents in date range", rents_in_range({}), False),
+        ("Rents of user in date range", rents_in_range({"user_id": some_id}), False),
+        ("All authors", find("Authors", {}), True),
+        ("All categories", find("Categories", {}), True),
+    ]
+
+
+def _winning_plans(explain):
+    if isinstance(explain, dict):
+        for key, value in explain.items():
+            if key == "winningPlan":
+                yield value
+            else:
+                yield from _winning_plans(value)
+    elif isinstance(explain, list):
+        for item in explain:
+            yield from _winning_plans(item)
+
+
+def _has_collscan(plan):
+    if isinstance(plan, dict):
+        return plan.get("stage") == "COLLSCAN" or any(_has_collscan(v) for v in plan.values())
+    if isinstance(plan, list):
+        return any(_has_collscan(item) for item in plan)
+    return False
+
+
+async def verify_query_plans(db):
+    """
+    Explain every query shape and return the labels of those whose winning
+    plan contains a COLLSCAN.
+    """
+    failures = []
+    for label, explain, allow_collscan in query_shapes(db):
+        plans = list(_winning_plans(await explain()))
+        scans = any(_has_collscan(plan) for plan in plans)
+        logger.info("%-28s %s", label, "COLLSCAN" if scans else "indexed")
+        if scans and not allow_collscan:
+            failures.append(label)
+    return failures
+
+
+async def main(verify: bool):
+    from db import db
+
+    await ensure_indexes(db)
+    if verify:
+        failures = await verify_query_plans(db)
+        if failures:
+            print("Collection scans in: " + ", ".join(failures))
+            return 1
+        print("All query shapes use an index.")
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(asyncio.run(main("--verify" in sys.argv)))
@@ -0,0 +1,180 @@
+# invalidation.py
+"""
+Cross-worker cache invalidation.
+
+Every worker keeps principals and versioned responses in process. The bus
+keeps them coherent with writes made by other workers:
+
+- change_streams: tail one change stream on Books, Authors, Categories and
+  Users (needs a replica set). Sees every write, including ones made
+  outside the app.
+- poll: without a replica set, every worker appends its own invalidations
+  (versions.bump, invalidate_principal) to InvalidationLog, a capped
+  collection, and reads what the others appended through a tailable
+  cursor every INVALIDATION_POLL_INTERVAL seconds.
+
+In "auto" mode change streams are used when the deployment supports them.
+Whenever the bus (re)starts or loses its place, every cache is dropped,
+since events may have been missed.
+"""
+import asyncio
+import logging
+import uuid
+
+from pymongo import CursorType
+from pymongo.errors import CollectionInvalid, OperationFailure, PyMongoError
+
+from auth import principal_cache, principal_listeners, invalidate_principal, invalidate_principal_id
+from cache import versions
+from config import INVALIDATION_MODE, INVALIDATION_POLL_INTERVAL, INVALIDATION_LOG_SIZE
+from db import db
+
+logger = logging.getLogger(__name__)
+
+WATCHED = ("Books", "Authors", "Categories", "Users")
+LOG = "InvalidationLog"
+# Lets a worker skip its own log entries
+WORKER_ID = uuid.uuid4().hex
+
+
+class InvalidationBus:
+
+    def __init__(self, database, mode: str = INVALIDATION_MODE, poll_interval: float = INVALIDATION_POLL_INTERVAL):
+        self.db = database
+        self.mode = mode
+        self.poll_interval = poll_interval
+        self.stats = {"mode": None, "events": 0, "resets": 0}
+        self._task = None
+        self._writes = set()
+
+    async def start(self):
+        """
+        Pick the mode and start tailing in a background task.
+        """
+        if self.mode == "off":
+            return
+        if self.mode != "poll" and await self._change_streams_supported():
+            self.stats["mode"] = "change_streams"
+            self._task = asyncio.create_task(self._watch())
+        else:
+            await self._prepare_log()
+            versions.listeners.append(self._publish_bump)
+            principal_listeners.append(self._publish_principal)
+            self.stats["mode"] = "poll"
+            self._task = asyncio.create_task(self._poll())
+        logger.info("Cache invalidation bus running in %s mode", self.stats["mode"])
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._publish_bump in versions.listeners:
+            versions.listeners.remove(self._publish_bump)
+        if self._publish_principal in principal_listeners:
+            principal_listeners.remove(self._publish_principal)
+
+    async def _change_streams_supported(self) -> bool:
+        try:
+            async with self.db.watch([{"$match": {"ns.coll": {"$in": list(WATCHED)}}}]) as stream:
+                await stream.try_next()
+            return True
+        except OperationFailure as e:
+            if self.mode == "change_streams":
+                raise
+            logger.info("Change streams unavailable (%s), polling %s instead", e, LOG)
+            return False
+
+    def reset(self):
+        """
+        Drop everything cached: used when events may have been missed.
+        """
+        self.stats["resets"] += 1
+        versions.bump(*WATCHED, notify=False)
+        principal_cache.clear()
+
+    def apply(self, collection: str, user_id=None, email: str = None):
+        self.stats["events"] += 1
+        if collection == "Users":
+            if email is not None:
+                invalidate_principal(email, notify=False)
+            elif user_id is not None:
+                invalidate_principal_id(user_id)
+            else:
+                principal_cache.clear()
+        else:
+            versions.bump(collection, notify=False)
+
+    # Change stream mode
+
+    async def _watch(self):
+        pipeline = [{"$match": {"ns.coll": {"$in": list(WATCHED)}}}]
+        while True:
+            try:
+                async with self.db.watch(pipeline) as stream:
+                    # The first call opens the stream; anything written
+                    # before that was not seen
+                    change = await stream.try_next()
+                    self.reset()
+                    if change:
+                        self._handle(change)
+                    async for change in stream:
+                        self._handle(change)
+            except asyncio.CancelledError:
+                raise
+            except PyMongoError as e:
+                # The driver already retried once; start over on a fresh stream
+                logger.warning("Invalidation change stream failed: %s", e)
+                await asyncio.sleep(self.poll_interval)
+
+    def _handle(self, change: dict):
+        if change["operationType"] in ("drop", "rename", "dropDatabase", "invalidate"):
+            self.reset()
+        else:
+            self.apply(change["ns"]["coll"], user_id=change["documentKey"]["_id"])
+
+    # Poll mode
+
+    async def _prepare_log(self):
+        try:
+            await self.db.create_collection(LOG, capped=True, size=INVALIDATION_LOG_SIZE)
+        except CollectionInvalid:
+            pass
+        # A tailable cursor on an empty capped collection dies at once
+        await self.db[LOG].insert_one({"worker": WORKER_ID, "collection": None})
+
+    def _publish(self, entry: dict):
+        task = asyncio.get_running_loop().create_task(self.db[LOG].insert_one({"worker": WORKER_ID, **entry}))
+        self._writes.add(task)
+        task.add_done_callback(self._writes.discard)
+
+    def _publish_bump(self, collection: str):
+        if collection in WATCHED:
+            self._publish({"collection": collection})
+
+    def _publish_principal(self, email: str):
+        self._publish({"collection": "Users", "email": email})
+
+    async def _poll(self):
+        while True:
+            try:
+                # The cursor starts at the oldest entry; replaying those is
+                # harmless, and reset() covers anything older
+                cursor = self.db[LOG].find({}, cursor_type=CursorType.TAILABLE)
+                self.reset()
+                while cursor.alive:
+                    async for entry in cursor:
+                        if entry["worker"] != WORKER_ID and entry["collection"]:
+                            self.apply(entry["collection"], email=entry.get("email"))
+                    await asyncio.sleep(self.poll_interval)
+            except asyncio.CancelledError:
+                raise
+            except PyMongoError as e:
+                logger.warning("Invalidation log tailing failed: %s", e)
+            # The cursor died (e.g. the log wrapped past it); reopen it
+            await asyncio.sleep(self.poll_interval)
+
+
+bus = InvalidationBus(db)
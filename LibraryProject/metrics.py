@@ -0,0 +1,325 @@
+# metrics.py
+"""
+Request and MongoDB instrumentation, exposed in Prometheus text format.
+
+MetricsMiddleware times every request per route template and tracks the
+requests in flight; command_listener (registered on the Mongo client)
+times every command per collection and counts the round trips each
+request makes, and pool_listener tracks connection pool usage and wait
+time. render() produces the /metrics body.
+"""
+import bisect
+import contextvars
+import threading
+import time
+
+from pymongo import monitoring
+from starlette.datastructures import MutableHeaders
+from starlette.routing import Match
+
+from config import METRICS_ROUND_TRIP_HEADER
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ROUND_TRIP_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50, 100)
+
+registry = []
+collectors = []
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels=()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        registry.append(self)
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, _labels(self.labels, key), value) for key, value in self._values.items()]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+        registry.append(self)
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(labels)
+            if counts is None:
+                # Per-bucket counts, then the +Inf count and the sum
+                counts = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[index] += 1
+            counts[-1] += value
+
+    def samples(self):
+        with self._lock:
+            values = {key: list(counts) for key, counts in self._values.items()}
+        samples = []
+        for key, counts in values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                samples.append((f"{self.name}_bucket", _labels(self.labels + ("le",), key + (bound,)), cumulative))
+            samples.append((f"{self.name}_sum", _labels(self.labels, key), counts[-1]))
+            samples.append((f"{self.name}_count", _labels(self.labels, key), cumulative))
+        return samples
+
+
+def render() -> str:
+    """
+    Every metric in the Prometheus text exposition format.
+    """
+    lines = []
+    for metric in registry:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(f"{name}{labels} {value}" for name, labels, value in metric.samples())
+    for collect in collectors:
+        lines.extend(collect())
+    return "\n".join(lines) + "\n"
+
+
+def _gauges(name: str, help: str, kind: str, samples):
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+    lines.extend(f"{name}{labels} {value}" for labels, value in samples)
+    return lines
+
+
+def _cache_and_hash_samples():
+    # Counters the caches and the bcrypt pool already keep, read at scrape time
+    import hashing
+    from cache import caches
+
+    stats = {name: cache.stats() for name, cache in caches.items()}
+    lines = []
+    for field, kind in (("hits", "counter"), ("misses", "counter"), ("evictions", "counter"), ("size", "gauge")):
+        name = f"cache_{field}_total" if kind == "counter" else f"cache_{field}"
+        lines += _gauges(name, f"In-process cache {field}", kind,
+                         [(_labels(("cache",), (cache,)), values[field]) for cache, values in stats.items()])
+    lines += _gauges("password_hash_calls_total", "bcrypt hashes and checks", "counter",
+                     [("", hashing.stats["calls"])])
+    lines += _gauges("password_hash_rejected_total", "Hash requests refused with 503", "counter",
+                     [("", hashing.stats["rejected"])])
+    lines += _gauges("password_hash_pending", "Hash requests queued or running", "gauge",
+                     [("", hashing.stats["pending"])])
+    return lines
+
+
+collectors.append(_cache_and_hash_samples)
+
+request_duration = Histogram(
+    "http_request_duration_seconds", "Request latency, until the response body is sent",
+    labels=("method", "route", "status"),
+)
+requests_in_flight = Gauge("http_requests_in_flight", "Requests being handled", labels=("method", "route"))
+request_round_trips = Histogram(
+    "http_request_db_round_trips", "MongoDB commands sent per request",
+    labels=("method", "route"), buckets=ROUND_TRIP_BUCKETS,
+)
+mongo_command_duration = Histogram(
+    "mongo_command_duration_seconds", "MongoDB command latency as seen by the driver",
+    labels=("collection", "command"),
+)
+mongo_command_failures = Counter(
+    "mongo_command_failures_total", "MongoDB commands that returned an error",
+    labels=("collection", "command"),
+)
+mongo_commands = Counter(
+    "mongo_commands_total", "MongoDB commands per server, to check read routing",
+    labels=("address", "command"),
+)
+
+
+class _RoundTrips:
+    __slots__ = ("count",)
+
+    def __init__(self):
+        self.count = 0
+
+
+# Motor runs pymongo calls with a copy of the caller's context, so the
+# listener sees the counter of the request that issued the command
+_round_trips = contextvars.ContextVar("round_trips", default=None)
+
+
+def round_trips() -> int:
+    """
+    MongoDB commands sent so far by the current request.
+    """
+    counter = _round_trips.get()
+    return counter.count if counter else 0
+
+
+class CommandMetrics(monitoring.CommandListener):
+    def __init__(self):
+        self._collections = {}
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        if not isinstance(collection, str):
+            # getMore carries the cursor id there; the namespace is in "collection"
+            collection = event.command.get("collection", "")
+        self._collections[(event.connection_id, event.request_id)] = collection
+        mongo_commands.inc(_address(event.connection_id), event.command_name)
+        counter = _round_trips.get()
+        if counter is not None:
+            counter.count += 1
+
+    def succeeded(self, event):
+        collection = self._collections.pop((event.connection_id, event.request_id), "")
+        mongo_command_duration.observe(event.duration_micros / 1e6, collection, event.command_name)
+
+    def failed(self, event):
+        collection = self._collections.pop((event.connection_id, event.request_id), "")
+        mongo_command_duration.observe(event.duration_micros / 1e6, collection, event.command_name)
+        mongo_command_failures.inc(collection, event.command_name)
+
+
+command_listener = CommandMetrics()
+
+mongo_pool_wait = Histogram(
+    "mongo_pool_wait_seconds", "Time spent waiting to check a connection out of the pool",
+    labels=("address",),
+)
+mongo_pool_checkout_failures = Counter(
+    "mongo_pool_checkout_failures_total", "Connection check-outs that failed (e.g. wait queue timeout)",
+    labels=("address", "reason"),
+)
+mongo_pool_connections = Gauge("mongo_pool_connections", "Open pooled connections", labels=("address",))
+mongo_pool_checked_out = Gauge("mongo_pool_checked_out", "Connections in use", labels=("address",))
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    # Check-out starts and completes on the same driver thread
+    _local = threading.local()
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        started = getattr(self._local, "started", None)
+        if started is not None:
+            mongo_pool_wait.observe(time.perf_counter() - started, _address(event.address))
+        mongo_pool_checked_out.inc(_address(event.address))
+
+    def connection_check_out_failed(self, event):
+        started = getattr(self._local, "started", None)
+        if started is not None:
+            mongo_pool_wait.observe(time.perf_counter() - started, _address(event.address))
+        mongo_pool_checkout_failures.inc(_address(event.address), event.reason)
+
+    def connection_checked_in(self, event):
+        mongo_pool_checked_out.dec(_address(event.address))
+
+    def connection_created(self, event):
+        mongo_pool_connections.inc(_address(event.address))
+
+    def connection_closed(self, event):
+        mongo_pool_connections.dec(_address(event.address))
+
+    def connection_ready(self, event):
+        pass
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+
+def _address(address) -> str:
+    host, port = address
+    return f"{host}:{port}"
+
+
+pool_listener = PoolMetrics()
+
+
+def route_template(scope) -> str:
+    """
+    The path template of the route a request matches ("/book/{book_id}"),
+    so metrics are not labelled with every distinct id.
+    """
+    for route in scope["app"].router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, "path", scope["path"])
+    return "unmatched"
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware: latency histogram and in-flight gauge per route,
+    and DB round trips per request. With METRICS_ROUND_TRIP_HEADER the
+    count at the time the headers go out is sent as X-DB-Round-Trips.
+    """
+
+    def __init__(self, app, round_trip_header: bool = METRICS_ROUND_TRIP_HEADER):
+        self.app = app
+        self.round_trip_header = round_trip_header
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = route_template(scope)
+        counter = _RoundTrips()
+        token = _round_trips.set(counter)
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if self.round_trip_header:
+                    MutableHeaders(scope=message).append("X-DB-Round-Trips", str(counter.count))
+            await send(message)
+
+        requests_in_flight.inc(method, route)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_duration.observe(time.perf_counter() - started, method, route, status_code)
+            request_round_trips.observe(counter.count, method, route)
+            requests_in_flight.dec(method, route)
+            _round_trips.reset(token)
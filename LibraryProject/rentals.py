@@ -0,0 +1,143 @@
+# rentals.py
+from datetime import datetime
+
+from fastapi import HTTPException, status
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from db import books_collection, histories_collection, users_collection
+
+
+async def rent_or_return(user_id, book_id, session=None):
+    """
+    Return the book if the user holds it, otherwise rent it.
+
+    The user's activeRents set decides which: pulling the book from it or
+    adding it to it is a single conditional write, so concurrent requests of
+    one user cannot both rent or both return the same book. The stock is
+    taken with a guarded $inc, so availableBook never goes below zero.
+    Returns (message, availableBook).
+    """
+    date_now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    # Returning: the user holds the book if it leaves their active set
+    held = await users_collection.update_one(
+        {"_id": user_id, "activeRents": book_id},
+        {"$pull": {"activeRents": book_id}},
+        session=session,
+    )
+    if held.modified_count:
+        rent = await histories_collection.find_one_and_update(
+            {"user_id": user_id, "book_id": book_id, "isReturned": False},
+            {"$set": {"isReturned": True, "dateReturn": date_now}},
+            projection={"_id": 1},
+            session=session,
+        )
+        # Without an open rent the entry was stale and no copy comes back
+        book = await books_collection.find_one_and_update(
+            {"_id": book_id},
+            {"$inc": {"availableBook": 1 if rent else 0}},
+            projection={"availableBook": 1},
+            return_document=ReturnDocument.AFTER,
+            session=session,
+        )
+        if book is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Book not found")
+        return "Book returned successfully.", book["availableBook"]
+
+    # Renting: claim the book in the user's active set first
+    claimed = await users_collection.update_one(
+        {"_id": user_id, "activeRents": {"$ne": book_id}},
+        {"$addToSet": {"activeRents": book_id}},
+        session=session,
+    )
+    if not claimed.modified_count:
+        # A concurrent request of the same user rented it in between
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Book is already rented")
+
+    # Take a copy only while one is in stock
+    book = await books_collection.find_one_and_update(
+        {"_id": book_id, "availableBook": {"$gt": 0}},
+        {"$inc": {"availableBook": -1}},
+        projection={"availableBook": 1},
+        return_document=ReturnDocument.AFTER,
+        session=session,
+    )
+    if book is None:
+        await users_collection.update_one({"_id": user_id}, {"$pull": {"activeRents": book_id}}, session=session)
+        if await books_collection.find_one({"_id": book_id}, {"_id": 1}, session=session) is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Book not found")
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Book is out of stock")
+
+    try:
+        await histories_collection.insert_one({
+            "user_id": user_id,
+            "book_id": book_id,
+            "dateLoan": date_now,
+            "isReturned": False
+        }, session=session)
+    except DuplicateKeyError:
+        if session is not None and session.in_transaction:
+            # The server has aborted the transaction, which gives the copy
+            # back and drops the set claim; the caller repairs the set
+            raise
+        # Histories already has an open rent the active set missed; keep the
+        # set claim (it is now correct) and give the copy back
+        await books_collection.update_one({"_id": book_id}, {"$inc": {"availableBook": 1}}, session=session)
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Book is already rented")
+
+    return "Book rented successfully.", book["availableBook"]
+
+
+async def rent_or_return_in_transaction(client, user_id, book_id):
+    """
+    Run rent_or_return inside a transaction (requires a replica set).
+    Transient errors are retried by the driver.
+    """
+    try:
+        async with await client.start_session() as session:
+            return await session.with_transaction(
+                lambda s: rent_or_return(user_id, book_id, session=s)
+            )
+    except DuplicateKeyError:
+        # Histories already has an open rent the active set missed; the
+        # aborted transaction rolled the claim back, so record it outside
+        await users_collection.update_one({"_id": user_id}, {"$addToSet": {"activeRents": book_id}})
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Book is already rented")
+
+
+async def reconcile_active_rents():
+    """
+    Rebuild every user's activeRents from the open rents in Histories.
+    Returns the number of users whose set was corrected.
+    """
+    open_rents = histories_collection.aggregate([
+        {"$match": {"isReturned": False}},
+        {"$group": {"_id": "$user_id", "books": {"$addToSet": "$book_id"}}},
+    ])
+    expected = {group["_id"]: group["books"] async for group in open_rents}
+
+    fixed = 0
+    users = users_collection.find(
+        {"$or": [{"_id": {"$in": list(expected)}}, {"activeRents.0": {"$exists": True}}]},
+        {"activeRents": 1},
+    )
+    async for user in users:
+        books = expected.get(user["_id"], [])
+        if set(user.get("activeRents", [])) != set(books):
+            await users_collection.update_one({"_id": user["_id"]}, {"$set": {"activeRents": books}})
+            fixed += 1
+    return fixed
+
+
+if __name__ == "__main__":
+    import argparse
+    import asyncio
+
+    parser = argparse.ArgumentParser(description="Rent maintenance jobs.")
+    parser.add_argument("--reconcile", action="store_true", help="rebuild users' activeRents from Histories")
+    args = parser.parse_args()
+    if args.reconcile:
+        print(f"Reconciled activeRents of {asyncio.run(reconcile_active_rents())} users.")
+    else:
+        parser.print_help()
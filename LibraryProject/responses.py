@@ -0,0 +1,29 @@
+# responses.py
+import orjson
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+
+
+def _default(obj):
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(content) -> bytes:
+    """
+    Serialize Mongo documents to JSON in one pass: ObjectId becomes its hex
+    string, datetime is written natively by orjson as ISO 8601.
+    """
+    return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class BSONJSONResponse(JSONResponse):
+    """
+    JSON response that accepts raw Mongo documents. The app-wide default;
+    return it explicitly when the content contains ObjectIds, since FastAPI
+    runs plain return values through jsonable_encoder first.
+    """
+
+    def render(self, content) -> bytes:
+        return dumps(content)
@@ -1,114 +1,122 @@
 # routes.py
 import os
-import bcrypt
-import json
 from datetime import datetime, timedelta
 
-from fastapi import APIRouter, HTTPException, Body, Depends, Request, status, Form
-from fastapi.responses import JSONResponse, HTMLResponse, FileResponse, RedirectResponse
+from fastapi import APIRouter, HTTPException, Body, Depends, Request, status, Form, Query, Response
+from fastapi.responses import RedirectResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordBearer
 from bson.objectid import ObjectId
 from db import books_collection, categories_collection, authors_collection, histories_collection, users_collection
-from auth import authenticate_user
-from jinja2 import Environment, FileSystemLoader
-from auth import authenticate_user, create_access_token, verify_token
+from templating import get_template, buffered
+from static_assets import asset_response
+from auth import create_access_token, verify_token, revoke_token, load_principal, invalidate_principal, get_cookie_principal
 from typing import List, Dict
 
 from models import LoginRequest, RegistrationRequest, BookRequest, Category, Author
-from db import db
-from config import ACCESS_TOKEN_EXPIRE_MINUTES
+from db import db, client, reporting_db, read_db, causal_session
+from config import ACCESS_TOKEN_EXPIRE_MINUTES, RENT_TRANSACTIONS, HTML_STREAM_BATCH_SIZE, RENTS_STREAM_BATCH_SIZE
+from config import CATALOG_MAX_PAGE_SIZE, SEARCH_MAX_PAGE
+from rentals import rent_or_return, rent_or_return_in_transaction
+from cache import caches, versions, cached_json_response, search_cache
+from bulk import bulk_insert, bulk_result
+from responses import BSONJSONResponse, dumps
+from hashing import check_password, hash_password
+import hashing
+import metrics
+from archive import history_stages
+from catalog import catalog_params, catalog_page, search_books, autocomplete, denormalize_books, refresh_authors, refresh_categories
 
 router = APIRouter()
 
-# Jinja2 template setup
-file_loader = FileSystemLoader('templates')
-env = Environment(loader=file_loader)
-
 # Routes - Authentication and User Management
 
 @router.get('/favicon.ico', include_in_schema=False)
-async def favicon():
-    return FileResponse('favicon.ico')
+async def favicon(request: Request):
+    return asset_response(request, "favicon")
 
 @router.get("/login", summary="Login page")
-def login_get(request: Request):
+async def login_get(request: Request):
     """
     Render the login page. If the user is already authenticated, redirect them to the book list.
+    The page is served from memory without a DB call: a valid token is
+    enough to redirect, since /book-list loads the user and drops the
+    cookie of one that no longer exists.
     """
     token = request.cookies.get("access_token")
     if token:
         try:
-            user_data = verify_token(token)
-            user = db['Users'].find_one({"emailUser": user_data["sub"]})
-            if user:
-                return RedirectResponse("/book-list")
+            verify_token(token)
+            return RedirectResponse("/book-list")
         except Exception:
             pass  # Invalid or expired token
-    return FileResponse("templates/login.html")
+    return asset_response(request, "login")
 
 @router.post("/login", summary="Login to obtain JWT token")
-def login(data: LoginRequest):
+async def login(data: LoginRequest):
     """
     Login user by verifying credentials and providing an access token.
     """
     email = data.emailUser
     password = data.passwordUser
-    searched_user = db['Users'].find_one({"emailUser": email})
+    searched_user = await db['Users'].find_one({"emailUser": email})
 
-    if not searched_user or not bcrypt.checkpw(password.encode('utf-8'), searched_user['passwordUser'].encode('utf-8')):
+    if not searched_user or not await check_password(password, searched_user['passwordUser']):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Login failed")
 
     token = create_access_token({"sub": searched_user['emailUser']}, expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
-    response = JSONResponse(content={"message": "Login successful"})
+    response = BSONJSONResponse(content={"message": "Login successful"})
     response.set_cookie(key="access_token", value=token, httponly=True, secure=True)
     return response
 
 @router.get("/registration", summary="Registration page")
-def register_page():
+async def register_page(request: Request):
     """
     Render the registration page.
     """
-    return FileResponse("templates/registration.html")
+    return asset_response(request, "registration")
 
 @router.post("/registration", summary="Post method for Registration")
-def create_user(data: RegistrationRequest):
+async def create_user(data: RegistrationRequest):
     """
     Create a new user with the provided data, hashing the password, and assigning a creation date.
     """
-    try:
-        # Hash the password
-        hashed_password = bcrypt.hashpw(data.passwordUser.encode('utf-8'), bcrypt.gensalt())
+    # Hash the password (outside the try, so a busy pool answers 503 rather than 409)
+    hashed_password = await hash_password(data.passwordUser)
 
+    try:
         # Add the creation date
         creation_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
         # Insert user data into the database
-        inserted_user = users_collection.insert_one({
+        await users_collection.insert_one({
             "nameUser": data.nameUser,
             "surnameUser": data.surnameUser,
-            "passwordUser": hashed_password.decode('utf-8'),
+            "passwordUser": hashed_password,
             "is_admin": False,
             "emailUser": data.emailUser,
             "numberUser": data.numberUser,
-            "created_at": creation_date
+            "created_at": creation_date,
+            "activeRents": []
         })
-
-        user = users_collection.find_one({"_id": inserted_user.inserted_id})
+        invalidate_principal(data.emailUser)
 
     except Exception:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Registration failed")
 
-    response = JSONResponse(content={"message": f"User {user['nameUser']} successfully registered"})
-    token = create_access_token({"sub": user['emailUser']}, expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
+    response = BSONJSONResponse(content={"message": f"User {data.nameUser} successfully registered"})
+    token = create_access_token({"sub": data.emailUser}, expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
     response.set_cookie(key="access_token", value=token, httponly=True, secure=True)
 
     return response
 
 @router.get("/clear-cookie", summary="Clear the authentication cookie")
-def clear_cookie():
+async def clear_cookie(request: Request):
     """
-    Clears the authentication cookie.
+    Clears the authentication cookie and revokes its token.
     """
+    token = request.cookies.get("access_token")
+    if token:
+        revoke_token(token)
     response = RedirectResponse("/login")
     response.delete_cookie("access_token")
     return response
@@ -116,134 +124,154 @@ def clear_cookie():
 # Routes - Book and Category Management
 
 @router.get("/book-list", summary="Books view in library")
-def book_list_page(request: Request):
+async def book_list_page(request: Request, params: dict = Depends(catalog_params), user = Depends(get_cookie_principal)):
     """
-    Displays a list of books, with data tailored based on the user's role (admin/user).
+    Displays a page of books, with data tailored based on the user's role (admin/user).
     """
-    user_data = authenticate_user(request)
-    user = db['Users'].find_one({"emailUser": user_data["sub"]})
-    output = render_book_list(user)
-    return HTMLResponse(output)
+    output = await render_book_list(user, params, request)
+    return StreamingResponse(buffered(output), media_type="text/html")
 
-def render_book_list(user):
+async def render_book_list(user, params, request):
     """
-    Renders the list of books, differentiating between admin and user roles.
+    Renders a page of books, differentiating between admin and user roles.
+    Returns an async iterator of HTML chunks.
     """
     if user["is_admin"]:
         template_file = 'book-list-roles/admin-book-list.html'
     else:
         template_file = 'book-list-roles/user-book-list.html'
 
-    book_list_page = env.get_template(template_file)
-    rents_book_id = []
-
-    books_dict = books_collection.aggregate([
-        {"$lookup": {"from": "Categories", "localField": "category_id", "foreignField": "_id", "as": "category"}},
-        {"$lookup": {"from": "Authors", "localField": "author_id", "foreignField": "_id", "as": "author"}},
-        {"$unwind": "$author"},
-        {"$project": {
-            "_id": 1, "nameBook": 1, "yearBook": 1, "availableBook": 1,
-            "categoryName": "$category.nameCategory",
-            "authorName": {"$concat": ["$author.nameAuthor", " ", "$author.surnameAuthor"]}
-        }},
-        {"$sort": {"_id": 1}}
-    ])
+    book_list_page = get_template(template_file)
+    rents_book_id = ()
+
+    books_dict, next_cursor = await catalog_page(**params, books_source=read_db("Books")["Books"])
 
     if not user["is_admin"]:
-        rents = histories_collection.find({"user_id": user["_id"], "isReturned": False}, {"book_id": 1})
-        rents_book_id = [rent["book_id"] for rent in rents]
+        rents_book_id = set(user.get("activeRents", []))
 
-    output = book_list_page.render(
+    output = book_list_page.generate_async(
         books=books_dict,
         username=user["emailUser"],
-        rents_book_id=rents_book_id
+        rents_book_id=rents_book_id,
+        next_url=request.url.include_query_params(after=next_cursor) if next_cursor else None,
+        first_url=request.url.remove_query_params("after") if "after" in request.query_params else None
     )
     return output
 
+@router.get("/api/books", summary="Catalog page as JSON")
+async def catalog_api(request: Request, params: dict = Depends(catalog_params)):
+    """
+    Returns a page of books with category and author names.
+    Pass the returned `next` value as `after` to fetch the following page.
+    """
+    async def build():
+        books, next_cursor = await catalog_page(**params, books_source=read_db("Books")["Books"])
+        return {"books": books, "next": next_cursor}
+
+    return await cached_json_response(request, f"catalog?{request.url.query}", ("Books",), build)
+
+@router.get("/books/search", summary="Search the catalog")
+async def search_books_api(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=200, description="Words to find in titles, authors and categories"),
+    prefix: bool = Query(False, description="Autocomplete: titles starting with q, in title order"),
+    page: int = Query(1, ge=1, le=SEARCH_MAX_PAGE),
+    limit: int = Query(None, ge=1, le=CATALOG_MAX_PAGE_SIZE),
+):
+    """
+    Searches books by title, author and category name, best matches first.
+    With `prefix=true` returns title suggestions for autocomplete instead.
+    Pass the returned `next` value as `page` to fetch the following page.
+    """
+    async def build():
+        books_source = read_db("Books")["Books"]
+        options = {"page": page, "books_source": books_source}
+        if limit:
+            options["limit"] = limit
+        if prefix:
+            books, next_page = await autocomplete(q, **options)
+        else:
+            books, next_page = await search_books(q, **options)
+        return {"books": books, "next": next_page}
+
+    return await cached_json_response(request, request.url.query, ("Books",), build, cache=search_cache)
+
 @router.post("/book", summary="Post method for Book")
-def book_post_page(request: Request, data: BookRequest):
+async def book_post_page(data: BookRequest, user = Depends(get_cookie_principal)):
     """
     Adds a new book to the library.
     Only accessible to admin users.
     """
-    user_data = authenticate_user(request)
-    user = db['Users'].find_one({"emailUser": user_data["sub"]})
-
     if not user["is_admin"]:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Authorization failed")
     
-    books_collection.insert_one({
+    book = {
         "nameBook": data.nameBook,
         "yearBook": data.yearBook,
         "availableBook": data.availableBook,
         "category_id": ObjectId(data.category_id),
         "author_id": ObjectId(data.author_id)
-    })
+    }
+    await denormalize_books([book])
+    await books_collection.insert_one(book)
+    versions.bump("Books")
 
     return {"message": "Book added successfully."}
 
-class CustomJSONEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, ObjectId):
-            return str(obj)  # Convert ObjectId to string
-        return super().default(obj)
-    
 @router.get("/book/{book_id}", summary="Get for getting one specific book")
-def book_page(book_id: str):
+async def book_page(book_id: str):
     """
     Retrieves information about a specific book by its ID.
     """
     # Fetch the book from the database
-    book = books_collection.find_one({"_id": ObjectId(book_id)})
+    book = await books_collection.find_one({"_id": ObjectId(book_id)})
 
     if not book:
         # If the book is not found, raise a 404 exception
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Book not found")
 
     # Return the book as a JSON response
-    return JSONResponse(content=json.loads(json.dumps(book, cls=CustomJSONEncoder)))
+    return BSONJSONResponse(book)
 
 @router.put("/book", summary="Put method for Book")
-def edit_book(request: Request, data: BookRequest):
+async def edit_book(data: BookRequest, user = Depends(get_cookie_principal)):
     """
     Edits an existing book in the library. 
     Only accessible to admin users.
     """
-    user_data = authenticate_user(request)
-    user = db['Users'].find_one({"emailUser": user_data["sub"]})
-
     if not user or not user.get("is_admin"):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Authorization failed")
     
-    result = books_collection.update_one(
-        {"_id": ObjectId(data.id)},  
-        {"$set": {
-            "nameBook": data.nameBook,
-            "yearBook": data.yearBook,
-            "availableBook": data.availableBook,
-            "category_id": ObjectId(data.category_id),
-            "author_id": ObjectId(data.author_id)
-        }}
-    )
+    book = {
+        "nameBook": data.nameBook,
+        "yearBook": data.yearBook,
+        "availableBook": data.availableBook,
+        "category_id": ObjectId(data.category_id),
+        "author_id": ObjectId(data.author_id)
+    }
+    await denormalize_books([book])
+    update = {"$set": book}
+    if "authorName" not in book:
+        update["$unset"] = {"authorName": ""}
+    result = await books_collection.update_one({"_id": ObjectId(data.id)}, update)
+    versions.bump("Books")
     if result.matched_count == 0:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Book not found")
 
     return {'message': 'Updated successfully'}
 
 @router.delete("/book/{book_id}", summary="Delete method for Book")
-def delete_book(book_id: str, request: Request):
+async def delete_book(book_id: str, user = Depends(get_cookie_principal)):
     """
     Deletes a book from the library based on its ID.
     Only accessible to admin users.
     """
-    user_data = authenticate_user(request)
-    user = db['Users'].find_one({"emailUser": user_data["sub"]})
-
     if not user or not user.get("is_admin"):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Authorization failed")
 
     book_id_obj = ObjectId(book_id)
-    deleted_book = books_collection.find_one_and_delete({"_id": book_id_obj})
+    deleted_book = await books_collection.find_one_and_delete({"_id": book_id_obj})
+    versions.bump("Books")
 
     if deleted_book:
         return {'message': 'Deleted successfully'}
@@ -251,98 +279,87 @@ def delete_book(book_id: str, request: Request):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Book not found")
 
 @router.post("/book-list", summary="Post method for Books")
-def books_post_page(data: list[dict] = Body(...)):
+async def books_post_page(data: list[dict] = Body(...), return_all: bool = Query(False, description="Also return the whole collection")):
     """
     Create new books with the provided data.
+    Inserts in unordered batches and reports the inserted IDs and per-item errors.
     """
     try:
-        for book_data in data:
-            # Insert each book into the Books collection
-            books_collection.insert_one(book_data)
-        # Fetch all books after insertion
-        books = books_collection.find()
-        books_dict = [book for book in books]
+        await denormalize_books(data)
+        inserted_ids, errors = await bulk_insert(books_collection, data)
+        response = bulk_result(inserted_ids, errors)
+        if return_all:
+            # Fetch all books after insertion
+            response["books"] = await books_collection.find().to_list(length=None)
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
-    return books_dict
+    finally:
+        versions.bump("Books")
+    return BSONJSONResponse(response)
 
 # Routes - Renting and History Management
 
 @router.post("/book/{book_id}/rent", summary="Renting a book")
-def rent_book(book_id: str, request: Request):
+async def rent_book(book_id: str, user = Depends(get_cookie_principal)):
     """
     Rent or return a book for a user.
     """
-    date_now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    # Authenticate user
-    user_data = authenticate_user(request)
-    user = db['Users'].find_one({"emailUser": user_data["sub"]})
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authentication failed")
     try:
         # Convert the book_id to ObjectId
         book_id_obj = ObjectId(book_id)
-        # Check if there's an existing rental record
-        rent = histories_collection.find_one({"user_id": user['_id'], "book_id": book_id_obj, "isReturned": False})
-        if rent:  # If rental record already exists (returning the book)
-            # Update the existing rental record
-            histories_collection.update_one(
-                {"_id": rent["_id"]},
-                {"$set": {"isReturned": True, "dateReturn": date_now}}
-            )
-            # Increase the availableBook count in the Books collection
-            books_collection.update_one({"_id": book_id_obj}, {"$inc": {"availableBook": 1}})
-            # Fetch updated availableBook count
-            updated_book = books_collection.find_one({"_id": book_id_obj})
-            available_books = updated_book["availableBook"]
-            return {"message": "Book returned successfully.", "availableBook": available_books}
-        else:  # Else create a new rental record (renting the book)
-            # Insert a new rental record
-            histories_collection.insert_one({
-                "user_id": user['_id'],
-                "book_id": book_id_obj,
-                "dateLoan": date_now,
-                "isReturned": False
-            })
-            # Decrease the availableBook count in the Books collection
-            books_collection.update_one({"_id": book_id_obj}, {"$inc": {"availableBook": -1}})
-            # Fetch updated availableBook count
-            updated_book = books_collection.find_one({"_id": book_id_obj})
-            available_books = updated_book["availableBook"]
-            return {"message": "Book rented successfully.", "availableBook": available_books}
+        if RENT_TRANSACTIONS:
+            message, available_books = await rent_or_return_in_transaction(client, user['_id'], book_id_obj)
+        else:
+            async with causal_session() as session:
+                message, available_books = await rent_or_return(user['_id'], book_id_obj, session=session)
+        versions.bump("Books")
+        return {"message": message, "availableBook": available_books}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+    finally:
+        # The user's activeRents may have changed
+        invalidate_principal(user['emailUser'])
     
 @router.get("/rents-list", summary="List of Rents")
-def book_list_page(request: Request):
+async def book_list_page(
+    date_from: str = Query(None, description="Rents loaned at or after this date, including archived ones"),
+    date_to: str = Query(None, description="Rents loaned at or before this date, including archived ones"),
+    user = Depends(get_cookie_principal),
+):
     """
     Renders the rent list page for the current user.
     Admins see all rents, while regular users see only their rents.
+    Without a date range only active and recent rents are shown.
     """
-    user_data = authenticate_user(request)
-    user = db["Users"].find_one({"emailUser": user_data["sub"]})
-
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
 
     if user.get("is_admin"):
         # Admins see all rents
-        output = render_rent_list(user)
+        output = await render_rent_list(user, date_from, date_to)
     else:
         # Regular users see only their rents
-        output = render_user_rent_list(user)
+        output = await render_user_rent_list(user, date_from, date_to)
 
-    return HTMLResponse(output)
+    return StreamingResponse(buffered(output), media_type="text/html")
 
 
-def render_rent_list(user):
+async def render_rent_list(user, date_from=None, date_to=None):
     """
     Renders the rent list with all rents for admin users.
+    Returns an async iterator of HTML chunks.
     """
-    book_list_page = env.get_template("rent-list.html")
+    book_list_page = get_template("rent-list.html")
 
-    # Aggregating rental data with user and book information
-    rents = histories_collection.aggregate([
+    # Aggregating rental data with user and book information (a report, so
+    # it may be served by a secondary)
+    rents = reporting_db["Histories"].aggregate([
+        *await history_stages({}, date_from, date_to),
+        {"$sort": {"isReturned": 1, "dateLoan": -1}},
         {
             "$lookup": {
                 "from": "Users",
@@ -373,27 +390,29 @@ def render_rent_list(user):
                 "bookName": "$book.nameBook",
             }
         },
-        {"$sort": {"isReturned": 1, "dateLoan": -1}},
-    ])
-
-    rents_list = list(rents)
+    ], batchSize=HTML_STREAM_BATCH_SIZE)
 
-    output = book_list_page.render(
-        rents=rents_list,
-        username=user["emailUser"]
+    # The cursor is handed to the template as is, so rows are rendered as batches arrive
+    output = book_list_page.generate_async(
+        rents=rents,
+        username=user["emailUser"],
+        date_from=date_from,
+        date_to=date_to,
     )
     return output
 
 
-def render_user_rent_list(user):
+async def render_user_rent_list(user, date_from=None, date_to=None):
     """
     Renders the rent list for a regular user, showing only their rents.
+    Returns an async iterator of HTML chunks.
     """
-    book_list_page = env.get_template("rent-list.html")
+    book_list_page = get_template("rent-list.html")
 
     # Aggregating rental data for the current user
     rents = histories_collection.aggregate([
-        {"$match": {"user_id": user["_id"]}},
+        *await history_stages({"user_id": user["_id"]}, date_from, date_to),
+        {"$sort": {"isReturned": 1, "dateLoan": -1}},
         {
             "$lookup": {
                 "from": "Users",
@@ -424,14 +443,14 @@ def render_user_rent_list(user):
                 "bookName": "$book.nameBook",
             }
         },
-        {"$sort": {"isReturned": 1, "dateLoan": -1}},
-    ])
+    ], batchSize=HTML_STREAM_BATCH_SIZE)
 
-    rents_list = list(rents)
-
-    output = book_list_page.render(
-        rents=rents_list,
-        username=user["emailUser"]
+    # The cursor is handed to the template as is, so rows are rendered as batches arrive
+    output = book_list_page.generate_async(
+        rents=rents,
+        username=user["emailUser"],
+        date_from=date_from,
+        date_to=date_to,
     )
     return output
 
@@ -439,19 +458,19 @@ def render_user_rent_list(user):
 # Routes - JWT token verification
 
 @router.post("/api/login", summary="API Login to obtain JWT token")
-def api_login(data: LoginRequest):
+async def api_login(data: LoginRequest):
     """
     API Login by verifying credentials and providing an access token.
     """
     email = data.emailUser
     password = data.passwordUser
-    searched_user = db['Users'].find_one({"emailUser": email})
+    searched_user = await db['Users'].find_one({"emailUser": email})
 
-    if not searched_user or not bcrypt.checkpw(password.encode('utf-8'), searched_user['passwordUser'].encode('utf-8')):
+    if not searched_user or not await check_password(password, searched_user['passwordUser']):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Login failed")
 
     token = create_access_token({"sub": searched_user['emailUser']}, expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
-    return JSONResponse(content={"access_token": token, "token_type": "bearer"})
+    return BSONJSONResponse(content={"access_token": token, "token_type": "bearer"})
 
     
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login") 
@@ -459,64 +478,89 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 def get_current_user(token: str = Depends(oauth2_scheme)):
     return verify_token(token)
 
+async def get_bearer_principal(current_user = Depends(get_current_user)):
+    return await load_principal(current_user["sub"])
+
+@router.get("/api/cache-stats", summary="Hit/miss counters of in-process caches")
+async def cache_stats(user = Depends(get_bearer_principal)):
+    """
+    Returns counters for every in-process cache.
+    Only accessible to admin users.
+    """
+    if not user or not user.get("is_admin"):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Authorization failed")
+    return {name: cache.stats() for name, cache in caches.items()}
+
+@router.get("/api/hash-stats", summary="Password hashing pool metrics")
+async def hash_stats(user = Depends(get_bearer_principal)):
+    """
+    Returns call counts, hash latency and queue wait of the bcrypt pool.
+    Only accessible to admin users.
+    """
+    if not user or not user.get("is_admin"):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Authorization failed")
+    return hashing.stats
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics_page():
+    """
+    Request, MongoDB, cache and hashing metrics in Prometheus text format.
+    """
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 # Routes - Categories and Authors Management
 @router.get("/authors")
-async def get_authors():
+async def get_authors(request: Request):
     """
     Fetches all authors and returns them in a list.
+    Served from cache with an ETag until an author is added or deleted.
     """
+    async def build():
+        authors = read_db("Authors")["Authors"]
+        return await authors.find({}, {"_id": 1, "nameAuthor": 1, "surnameAuthor": 1}).to_list(length=None)
+
     try:
-        authors = list(authors_collection.find({}, {"_id": 1, "nameAuthor": 1, "surnameAuthor": 1}))
-        return [
-            {
-                "_id": str(author["_id"]),
-                "nameAuthor": author["nameAuthor"],
-                "surnameAuthor": author["surnameAuthor"]
-            }
-            for author in authors
-        ]
+        return await cached_json_response(request, "authors", ("Authors",), build)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
 @router.post("/authors", summary="Post method for Authors")
-def authors_post_page(data: List[Author] = Body(...), current_user = Depends(get_current_user)):
+async def authors_post_page(
+    data: List[Author] = Body(...),
+    return_all: bool = Query(False, description="Also return the whole collection"),
+    user = Depends(get_bearer_principal),
+):
     """
     Create new authors with the provided data.
+    Inserts in unordered batches and reports the inserted IDs and per-item errors.
     This route is accessible only with a valid JWT token.
     """
-    user = db['Users'].find_one({"emailUser": current_user["sub"]})
-
     if not user["is_admin"]:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Authorization failed")
     
     try:
-        for author_data in data:
-            # Insert each author into the Authors collection
-            authors_collection.insert_one(author_data.dict())  # Use `.dict()` to get the model data as a dictionary
-        # Fetch all authors after insertion
-        authors = authors_collection.find()
-        authors_dict = []
+        # Use `.dict()` to get the model data as a dictionary
+        inserted_ids, errors = await bulk_insert(authors_collection, [author_data.dict() for author_data in data])
+        # Books may already reference these IDs
+        await refresh_authors(inserted_ids)
+        versions.bump("Authors", "Books")
+        response = bulk_result(inserted_ids, errors)
 
-        # Convert MongoDB documents to a JSON serializable format
-        for author in authors:
-            author_dict = dict(author)
-            author_dict["_id"] = str(author["_id"])  # Convert ObjectId to string
-            authors_dict.append(author_dict)
+        if return_all:
+            # Fetch all authors after insertion
+            response["authors"] = await authors_collection.find().to_list(length=None)
 
-        return {"authors": authors_dict}  # Return the list of authors as response
+        return BSONJSONResponse(response)
 
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
 @router.delete("/authors", summary="Delete method for Author by ID")
-def delete_author_by_id(author_id: str = Form(...), current_user = Depends(get_current_user)):
+async def delete_author_by_id(author_id: str = Form(...), user = Depends(get_bearer_principal)):
     """
     Delete an author by their ID using a form submission.
     This route is accessible only with a valid JWT token.
     """
-    # Get the user from the JWT token
-    user = db['Users'].find_one({"emailUser": current_user["sub"]})
-
     # Check if the user has admin privileges
     if not user["is_admin"]:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Authorization failed")
@@ -526,12 +570,16 @@ def delete_author_by_id(author_id: str = Form(...), current_user = Depends(get_c
         author_object_id = ObjectId(author_id)
 
         # Delete the author with the given ObjectId
-        result = authors_collection.delete_one({"_id": author_object_id})
+        result = await authors_collection.delete_one({"_id": author_object_id})
 
         if result.deleted_count == 0:
             # If no author is deleted, raise a 404 exception
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Author not found")
 
+        # Their books drop out of the catalog, as before
+        await refresh_authors([author_object_id])
+        versions.bump("Authors", "Books")
+
     except Exception as e:
         # Raise an internal server error if something goes wrong
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
@@ -539,93 +587,124 @@ def delete_author_by_id(author_id: str = Form(...), current_user = Depends(get_c
     return {"message": f"Author with ID '{author_id}' deleted successfully."}
 
 @router.get("/categories")
-async def get_categories():
+async def get_categories(request: Request):
     """
     Fetches all categories and returns them in a list.
+    Served from cache with an ETag until a category is added or deleted.
     """
+    async def build():
+        categories = read_db("Categories")["Categories"]
+        return await categories.find({}, {"_id": 1, "nameCategory": 1}).to_list(length=None)
+
     try:
-        categories = list(categories_collection.find({}, {"_id": 1, "nameCategory": 1}))
-        return [
-            {
-                "_id": str(category["_id"]), 
-                "nameCategory": category["nameCategory"]
-             }
-            for category in categories
-        ]
+        return await cached_json_response(request, "categories", ("Categories",), build)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
 @router.post("/categories", summary="Post method for Categories")
-def categories_post_page(data: List[Category] = Body(...), current_user = Depends(get_current_user)):
+async def categories_post_page(
+    data: List[Category] = Body(...),
+    return_all: bool = Query(False, description="Also return the whole collection"),
+    user = Depends(get_bearer_principal),
+):
     """
     Create new categories with the provided data.
+    Inserts in unordered batches and reports the inserted IDs and per-item errors.
     This route is accessible only with a valid JWT token.
     """
-    user = db['Users'].find_one({"emailUser": current_user["sub"]})
-
     if not user["is_admin"]:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Authorization failed")
     try:
-        # Insert each category into the Categories collection
-        for category_data in data:
-            categories_collection.insert_one(category_data.dict()) 
-
-        # Fetch all categories after insertion
-        categories = categories_collection.find()
+        inserted_ids, errors = await bulk_insert(categories_collection, [category_data.dict() for category_data in data])
+        await refresh_categories(inserted_ids)
+        versions.bump("Categories", "Books")
+        response = bulk_result(inserted_ids, errors)
 
-        categories_dict = []
-        for category in categories:
-            category["_id"] = str(category["_id"])
-            categories_dict.append(category)
+        if return_all:
+            # Fetch all categories after insertion
+            response["categories"] = await categories_collection.find().to_list(length=None)
 
-        return {"categories": categories_dict}  # Return the list of categories as response
+        return BSONJSONResponse(response)
 
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
 @router.delete("/categories", summary="Delete method for Category by Name")
-def delete_category_by_name(nameCategory: str = Form(...), current_user = Depends(get_current_user)):
+async def delete_category_by_name(nameCategory: str = Form(...), user = Depends(get_bearer_principal)):
     """
     Delete a category by its name.
     This route is accessible only with a valid JWT token.
     """
-    # Get the user from the JWT token
-    user = db['Users'].find_one({"emailUser": current_user["sub"]})
-
     # Check if the user has admin privileges
     if not user["is_admin"]:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Authorization failed")
 
     try:
         # Delete the category with the given name
-        result = categories_collection.delete_one({"nameCategory": nameCategory})
+        deleted_category = await categories_collection.find_one_and_delete({"nameCategory": nameCategory})
 
-        if result.deleted_count == 0:
+        if deleted_category is None:
             # If no category is deleted, raise a 404 exception
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Category not found")
 
+        await refresh_categories([deleted_category["_id"]])
+        versions.bump("Categories", "Books")
+
     except Exception as e:
         # Raise an internal server error if something goes wrong
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
     return {"message": f"Category with name '{nameCategory}' deleted successfully."}
 
+async def ndjson_lines(cursor):
+    """
+    Yields each document of a cursor as one line of newline-delimited JSON.
+    """
+    async for document in cursor:
+        yield dumps(document) + b"\n"
+
 @router.get("/api/rents", summary="List of Rents")
-def get_rents(current_user=Depends(get_current_user)):
+async def get_rents(
+    request: Request,
+    stream: bool = Query(False, description="Stream records as NDJSON"),
+    since: str = Query(None, description="Only rents loaned or returned at or after this time, e.g. 2024-05-01 12:00:00"),
+    limit: int = Query(None, ge=1),
+    date_from: str = Query(None, description="Rents loaned at or after this date, including archived ones"),
+    date_to: str = Query(None, description="Rents loaned at or before this date, including archived ones"),
+    user=Depends(get_bearer_principal),
+):
     """
     API endpoint to retrieve rents.
     Admin users get all rents, while regular users only get their own rents.
+    With `stream=true` or `Accept: application/x-ndjson` the records are
+    written one per line as the cursor yields them.
+    Archived rents are included only when a date range is given.
+    With `since`, rents come oldest change first with their changedAt;
+    the last changedAt is the next `since` (rents changed at that same
+    instant are sent again).
     """
-    histories_collection = db["Histories"]
-
-    # Get the user from the JWT token
-    user = db["Users"].find_one({"emailUser": current_user["sub"]})
-
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
 
+    # The admin report may be served by a secondary; users read their own
+    # rents from the primary, right after renting
+    histories_collection = reporting_db["Histories"] if user.get("is_admin") else db["Histories"]
+
+    if since:
+        # Incremental sync pages oldest change first, so a client that moves
+        # `since` to the newest changedAt it received never skips what a
+        # limit cut off
+        order = [
+            {"$addFields": {"changedAt": {"$max": ["$dateLoan", "$dateReturn"]}}},
+            {"$sort": {"changedAt": 1, "_id": 1}},
+        ]
+    else:
+        order = [{"$sort": {"isReturned": 1, "dateLoan": -1}}]
+
     # Define the aggregation pipeline
     pipeline = [
+        *order,
+        *([{"$limit": limit}] if limit else []),
         {
             "$lookup": {
                 "from": "Users",
@@ -654,21 +733,28 @@ def get_rents(current_user=Depends(get_current_user)):
                 "isReturned": 1,
                 "username": "$user.emailUser",
                 "bookName": "$book.nameBook",
+                **({"changedAt": 1} if since else {}),
             }
         },
-        {"$sort": {"isReturned": 1, "dateLoan": -1}},
     ]
 
+    match = {}
+    if since:
+        # Incremental sync: anything loaned or returned since the last pull
+        match["$or"] = [{"dateLoan": {"$gte": since}}, {"dateReturn": {"$gte": since}}]
+
     # Check if the user is an admin
-    if user.get("is_admin"):
-        # Admin: Fetch all rents
-        rents = histories_collection.aggregate(pipeline)
-    else:
+    if not user.get("is_admin"):
         # Regular user: Filter rents by the current user's ID
-        pipeline.insert(0, {"$match": {"user_id": user["_id"]}})
-        rents = histories_collection.aggregate(pipeline)
+        match["user_id"] = user["_id"]
+
+    pipeline[0:0] = await history_stages(match, date_from, date_to)
+
+    if stream or "application/x-ndjson" in request.headers.get("accept", ""):
+        rents = histories_collection.aggregate(pipeline, batchSize=RENTS_STREAM_BATCH_SIZE)
+        return StreamingResponse(ndjson_lines(rents), media_type="application/x-ndjson")
 
     # Convert the result to a list
-    rents_list = list(rents)
+    rents_list = await histories_collection.aggregate(pipeline).to_list(length=None)
 
-    return JSONResponse(content={"rents": rents_list})
\ No newline at end of file
+    return BSONJSONResponse({"rents": rents_list})
\ No newline at end of file
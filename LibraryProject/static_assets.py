@@ -0,0 +1,64 @@
+# static_assets.py
+import gzip
+import hashlib
+
+from fastapi import Request, Response
+
+from cache import etag_matches
+from compression import accepted_encodings
+from config import STATIC_MAX_AGE
+
+# name -> (path, media type, Cache-Control)
+# The HTML pages are revalidated on every visit (a 304 costs no disk or DB
+# work) so a deploy is picked up at once; the favicon is cached long-term.
+ASSETS = {
+    "favicon": ("favicon.ico", "image/x-icon", f"public, max-age={STATIC_MAX_AGE}"),
+    "login": ("templates/Login.html", "text/html; charset=utf-8", "no-cache"),
+    "registration": ("templates/registration.html", "text/html; charset=utf-8", "no-cache"),
+}
+
+
+class StaticAsset:
+    """
+    A file held in memory with a precompressed gzip variant and strong ETags.
+    """
+
+    def __init__(self, path: str, media_type: str, cache_control: str):
+        with open(path, "rb") as file:
+            self.body = file.read()
+        self.media_type = media_type
+        self.cache_control = cache_control
+        digest = hashlib.sha256(self.body).hexdigest()[:32]
+        self.etag = f'"{digest}"'
+        gzipped = gzip.compress(self.body, compresslevel=9, mtime=0)
+        # Only keep the gzip variant when it actually saves bytes
+        self.gzip_body = gzipped if len(gzipped) < len(self.body) else None
+        self.gzip_etag = f'"{digest}-gzip"'
+
+    def response(self, request: Request) -> Response:
+        use_gzip = self.gzip_body is not None and "gzip" in accepted_encodings(request.headers.get("accept-encoding", ""))
+        etag = self.gzip_etag if use_gzip else self.etag
+        headers = {"ETag": etag, "Cache-Control": self.cache_control, "Vary": "Accept-Encoding"}
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+        if use_gzip:
+            headers["Content-Encoding"] = "gzip"
+            return Response(content=self.gzip_body, media_type=self.media_type, headers=headers)
+        return Response(content=self.body, media_type=self.media_type, headers=headers)
+
+
+_assets = {}
+
+
+def load_assets():
+    """
+    Read and compress every asset. Called once at startup.
+    """
+    for name, (path, media_type, cache_control) in ASSETS.items():
+        _assets[name] = StaticAsset(path, media_type, cache_control)
+
+
+def asset_response(request: Request, name: str) -> Response:
+    if not _assets:
+        load_assets()
+    return _assets[name].response(request)
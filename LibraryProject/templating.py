@@ -0,0 +1,72 @@
+# templating.py
+import os
+from functools import lru_cache
+
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache
+
+from config import TEMPLATES_AUTO_RELOAD, TEMPLATE_BYTECODE_CACHE_DIR, HTML_STREAM_CHUNK_SIZE
+
+# Templates rendered by routes.py; compiled once at startup
+TEMPLATES = [
+    'book-list-roles/admin-book-list.html',
+    'book-list-roles/user-book-list.html',
+    'rent-list.html',
+]
+
+
+@lru_cache(maxsize=None)
+def get_env():
+    """
+    The Jinja environment, built on first use.
+
+    Async so pages can be streamed straight from Mongo cursors. In production
+    (auto reload off) templates are never re-checked on disk, and compiled
+    bytecode is persisted so a fresh worker does not compile from source.
+    """
+    if TEMPLATE_BYTECODE_CACHE_DIR:
+        os.makedirs(TEMPLATE_BYTECODE_CACHE_DIR, exist_ok=True)
+    return Environment(
+        loader=FileSystemLoader('templates'),
+        enable_async=True,
+        auto_reload=TEMPLATES_AUTO_RELOAD,
+        bytecode_cache=FileSystemBytecodeCache(TEMPLATE_BYTECODE_CACHE_DIR or None),
+    )
+
+
+_preloaded = {}
+
+
+def preload_templates():
+    """
+    Compile every template up front so the first requests do not pay for it.
+    """
+    for name in TEMPLATES:
+        _preloaded[name] = get_env().get_template(name)
+
+
+def get_template(name: str):
+    if TEMPLATES_AUTO_RELOAD:
+        return get_env().get_template(name)
+    template = _preloaded.get(name)
+    if template is None:
+        template = _preloaded[name] = get_env().get_template(name)
+    return template
+
+
+async def buffered(chunks, size: int = HTML_STREAM_CHUNK_SIZE):
+    """
+    Group the many small strings generate_async yields into chunks of about
+    `size` characters, so a streamed page is not sent as thousands of tiny
+    ASGI messages.
+    """
+    buffer = []
+    length = 0
+    async for chunk in chunks:
+        buffer.append(chunk)
+        length += len(chunk)
+        if length >= size:
+            yield "".join(buffer)
+            buffer = []
+            length = 0
+    if buffer:
+        yield "".join(buffer)